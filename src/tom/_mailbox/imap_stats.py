@@ -0,0 +1,15 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass()
+class IMAPStats:
+    """
+    Health metrics of the IMAP sessions of a mailbox, as returned by `Mailbox.imap_stats`. Durations are in seconds.
+    """
+
+    connected: bool = True
+    reconnects: int = 0                     # number of times the sessions have been reestablished
+    reconnect_attempts: int = 0             # number of reconnection attempts, including failed ones
+    last_outage: Optional[float] = None     # duration of the latest finished outage
+    total_outage: float = 0                 # total duration of outages, including the ongoing one
@@ -1,8 +1,66 @@
 import sys
+import re
+import zlib
 import socket
 import select
+import imaplib
 import imapclient as _imapclient
 from imapclient import *
+from imapclient.imapclient import join_message_ids, seq_to_parenstr_upper
+from imapclient.response_parser import parse_fetch_response
+from imapclient.util import to_ints
+
+_LITERAL8 = re.compile(rb'~(\{\d+\})$')
+
+if 'COMPRESS' not in imaplib.Commands:
+    imaplib.Commands['COMPRESS'] = ('AUTH', 'SELECTED')
+
+
+class _DeflateFile:
+    """
+    A replacement of `imaplib.IMAP4.file` that decompresses what the server sends after COMPRESS=DEFLATE (RFC 4978).
+
+    Unlike a buffered socket file, decompressed data is never lost if reading the socket raises, which happens when
+    `IMAPClient.idle_check` drains a non-blocking socket.
+    """
+
+    __CHUNK_SIZE = 65536
+
+    def __init__(self, sock: socket.socket):
+        self.__sock = sock
+        self.__decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.__buffer = bytearray()
+
+    def __fill(self) -> bool:
+        data = self.__sock.recv(self.__CHUNK_SIZE)
+        if not data:
+            return False
+        self.__buffer += self.__decompressor.decompress(data)
+        return True
+
+    def readline(self, limit: int = -1) -> bytes:
+        while True:
+            end = self.__buffer.find(b'\n') + 1
+            if end or 0 <= limit <= len(self.__buffer) or not self.__fill():
+                break
+        if not end:
+            end = len(self.__buffer)
+        if limit >= 0:
+            end = min(end, limit)
+        return self.__take(end)
+
+    def read(self, size: int) -> bytes:
+        while len(self.__buffer) < size and self.__fill():
+            pass
+        return self.__take(size)
+
+    def __take(self, size: int) -> bytes:
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        return data
+
+    def close(self):
+        pass
 
 
 class IMAPClient(_imapclient.IMAPClient):
@@ -10,6 +68,53 @@ class IMAPClient(_imapclient.IMAPClient):
     This class provdes some extensions to `imapclient.IMAPClient`
     """
 
+    def fetch(self, messages, data, modifiers=None):
+        """
+        This extends imapclient.IMAPClient.fetch with literal8 (RFC 3516), which servers use for BINARY data items
+
+        imaplib already reads `~{n}` literals like `{n}` ones, but the response parser only recognizes the latter.
+        """
+        if not messages:
+            return {}
+        args = [
+            'FETCH',
+            join_message_ids(messages),
+            seq_to_parenstr_upper(data),
+            seq_to_parenstr_upper(modifiers) if modifiers else None,
+        ]
+        if self.use_uid:
+            args.insert(0, 'UID')
+        tag = self._imap._command(*args)
+        typ, data = self._imap._command_complete('FETCH', tag)
+        self._checkok('fetch', typ, data)
+        typ, data = self._imap._untagged_response(typ, data, 'FETCH')
+        data = [(_LITERAL8.sub(rb'\1', item[0]), item[1]) if isinstance(item, tuple) else item for item in data]
+        response = parse_fetch_response(data, self.normalise_times, self.use_uid)
+        # drop unsolicited responses for other messages
+        return {uid: response[uid] for uid in to_ints(messages) if uid in response}
+
+    def compress(self) -> bool:
+        """
+        Enable COMPRESS=DEFLATE (RFC 4978) if the server supports it
+
+        :return: whether compression has been enabled
+        """
+        if not self.has_capability('COMPRESS=DEFLATE'):
+            return False
+        typ, data = self._imap._simple_command('COMPRESS', 'DEFLATE')
+        self._checkok('compress', typ, data)
+        imap = self._imap
+        sock = imap.sock
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+        def send(data: bytes):
+            sock.sendall(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH))
+
+        imap.file.close()
+        imap.file = _DeflateFile(sock)
+        imap.send = send
+        return True
+
     @imapclient.require_capability('IDLE')
     def idle_check(self, timeout: float = None, selfpipe: int = None):
         """
@@ -22,7 +127,8 @@ class IMAPClient(_imapclient.IMAPClient):
 
         :param timeout: operation timeout
         :param selfpipe: a file descriptor
-        :return: None if `selfpipe` is ready, otherwise same as `imapclient.IMAPClient.idle_check`
+        :return: None if `selfpipe` is ready, otherwise same as `imapclient.IMAPClient.idle_check`, except that
+        `IMAPClient.AbortError` is raised once the server has closed the connection, instead of returning nothing
         """
 
         sock = self._sock
@@ -49,7 +155,8 @@ class IMAPClient(_imapclient.IMAPClient):
                         # An imaplib.IMAP4.abort with "EOF" is raised
                         # under Python 3
                         err = sys.exc_info()[1]
-                        if 'EOF' in err.args[0]:
+                        if 'EOF' in err.args[0] and resps:
+                            # the connection is closed, which is raised by the next call
                             break
                         else:
                             raise
@@ -1,3 +1,5 @@
+from typing import Optional
+from .imap_stats import IMAPStats
 from ..credential import Credential
 from .mailbox_listener import MailboxListener
 from .mailbox_socket_interface import MailboxSocketInterface
@@ -5,14 +7,22 @@ from .mailbox_epoll_interface import MailboxEpollInterface
 
 
 class Mailbox(MailboxSocketInterface, MailboxEpollInterface):
-    def __init__(self, smtp: Credential, imap: Credential):
+    def __init__(
+            self,
+            smtp: Credential,
+            imap: Credential,
+            smtp_pool_size: Optional[int] = None,
+            state_file: Optional[str] = None):
         """
         Initialize and connect to a new mailbox.
 
         :param smtp: SMTP credential.
         :param imap: IMAP credential.
+        :param smtp_pool_size: the maximum number of concurrent SMTP sessions. Omit to use the configured default.
+        :param state_file: path to a file where the mailbox keeps track of examined emails, so that it does not rescan
+        the whole mailbox after restarting. Omit to rescan all unseen emails on every start.
         """
-        super().__init__(smtp=smtp, imap=imap)
+        super().__init__(smtp=smtp, imap=imap, smtp_pool_size=smtp_pool_size, state_file=state_file)
 
     def __del__(self):
         self.close()
@@ -23,6 +33,12 @@ class Mailbox(MailboxSocketInterface, MailboxEpollInterface):
         """
         super().close()
 
+    def imap_stats(self) -> IMAPStats:
+        """
+        Report reconnections and outages of the IMAP sessions, which are reconnected automatically if they fail.
+        """
+        return super().imap_stats()
+
     def join(self):
         """
         Join the internal threads.
@@ -7,7 +7,13 @@ from .epoll_context import EpollContext
 
 
 class MailboxBase:
-    _mutex: threading.RLock
+    """
+    Socket and epoll tables are copy-on-write: they are replaced as a whole under `_mutex` and never modified in place,
+    so lookups read the current table without locking. Socket states are protected by the lock of their own contexts.
+    """
+
+    _mutex: threading.RLock         # serializes updates of the tables below
+    __mutex_id: threading.Lock
     __next_socket_id = 0
     _sockets: Dict[int, SocketContext]
     _connected_sockets: Dict[Tuple[Endpoint, Endpoint], int]
@@ -18,6 +24,7 @@ class MailboxBase:
 
     def __init__(self):
         self._mutex = threading.RLock()
+        self.__mutex_id = threading.Lock()
         self._sockets = {}
         self._connected_sockets = {}
         self._listening_sockets = {}
@@ -34,13 +41,12 @@ class MailboxBase:
         :param status: a subclass of `SocketContext` to test with
         :return: the socket context object
         """
-        with self._mutex:
-            if not sid in self._sockets:
-                raise Exception('socket does not exist')
-            context = self._sockets[sid]
-            if not isinstance(context, status):
-                raise Exception('invalid status of socket')
-            return context
+        context = self._sockets.get(sid)
+        if context is None:
+            raise Exception('socket does not exist')
+        if not isinstance(context, status):
+            raise Exception('invalid status of socket')
+        return context
 
     def _socket_allocate_id(self) -> int:
         """
@@ -48,7 +54,7 @@ class MailboxBase:
 
         :return: the allocated socket id.
         """
-        with self._mutex:
+        with self.__mutex_id:
             sid = self.__next_socket_id
             self.__next_socket_id += 1
             return sid
@@ -61,17 +67,20 @@ class MailboxBase:
         :param type_: one of 'read' and 'error'
         :param ready: the new ready status
         """
-        with self._mutex:
-            context: socket_context.Epollable = self._socket_check_status(sid, socket_context.Epollable)
-            with context.mutex:
-                if type_ == 'read':
-                    eids = context.repolls
-                elif type_ == 'error':
-                    eids = context.xepolls
-                else:
-                    assert False
+        context: socket_context.Epollable = self._socket_check_status(sid, socket_context.Epollable)
+        # hold the socket lock so that concurrent updates of the same socket are applied in order
+        with context.mutex:
+            if type_ == 'read':
+                eids = list(context.repolls)
+            elif type_ == 'error':
+                eids = list(context.xepolls)
+            else:
+                assert False
+            epolls = self._epolls
             for eid in eids:
-                epoll_context = self._epolls[eid]
+                epoll_context = epolls.get(eid)
+                if epoll_context is None:
+                    continue
                 with epoll_context.cv:
                     if type_ == 'read':
                         rs = epoll_context.rrset
@@ -83,7 +92,7 @@ class MailboxBase:
                         rs.add(sid)
                         epoll_context.cv.notifyAll()
                     else:
-                        rs.remove(sid)
+                        rs.discard(sid)
 
     def _socket_shutdown(self, sid: int):
         """
@@ -91,19 +100,21 @@ class MailboxBase:
 
         :param sid: socket id
         """
+        context = self._sockets.get(sid)
+        if context is None:
+            return
+        with context.mutex:
+            context.closed = True
+            if isinstance(context, socket_context.Epollable):
+                self._socket_update_ready_status(sid, 'error', True)
+            if isinstance(context, socket_context.Waitable):
+                context: socket_context.Waitable
+                context.cv.notify_all()
         with self._mutex:
-            context = self._sockets.get(sid)
-            if context is None:
-                return
-            with context.mutex:
-                context.closed = True
-                if isinstance(context, socket_context.Epollable):
-                    self._socket_update_ready_status(sid, 'error', True)
-                if isinstance(context, socket_context.Waitable):
-                    context: socket_context.Waitable
-                    context.cv.notify_all()
-                if isinstance(context, socket_context.Connected):
-                    context: socket_context.Connected
-                    self._connected_sockets.pop((context.local_endpoint, context.remote_endpoint), None)
-                elif isinstance(context, socket_context.Listening):
-                    self._listening_sockets.pop(sid, None)
+            if isinstance(context, socket_context.Connected):
+                context: socket_context.Connected
+                key = context.local_endpoint, context.remote_endpoint
+                if self._connected_sockets.get(key) == sid:
+                    self._connected_sockets = {k: v for k, v in self._connected_sockets.items() if k != key}
+            elif isinstance(context, socket_context.Listening):
+                self._listening_sockets = {k: v for k, v in self._listening_sockets.items() if k != sid}
@@ -10,17 +10,20 @@ class MailboxEpollInterface(MailboxBase):
         with self._mutex:
             eid = self._next_epoll_id
             self._next_epoll_id += 1
-            self._epolls[eid] = EpollContext()
+            self._epolls = {**self._epolls, eid: EpollContext()}
             return eid
 
     def epoll_close(self, eid: int):
         context = self.__get_epoll(eid)
         with context.cv:
-            self.epoll_remove(eid, set(context.rset), set(context.xset))
+            rset, xset = set(context.rset), set(context.xset)
+        # socket locks are taken before epoll locks, so do not hold context.cv here
+        self.epoll_remove(eid, rset, xset)
+        with context.cv:
             context.closed = True
             context.cv.notify_all()
         with self._mutex:
-            del self._epolls[eid]
+            self._epolls = {k: v for k, v in self._epolls.items() if k != eid}
 
     def epoll_add(self, eid: int, rset: Set[int], xset: Set[int]):
         context = self.__get_epoll(eid)
@@ -59,8 +62,7 @@ class MailboxEpollInterface(MailboxBase):
             return set(context.rrset), set(context.rxset)
 
     def __get_epoll(self, eid: int):
-        with self._mutex:
-            context = self._epolls.get(eid)
+        context = self._epolls.get(eid)
         if not context:
             raise Exception('epoll does not exist')
         return context
@@ -72,8 +74,8 @@ class MailboxEpollInterface(MailboxBase):
             __contexts: List[socket_context.Epollable]
 
             def __enter__(self) -> List[socket_context.Epollable]:
-                with mailbox._mutex:
-                    self.__contexts = [mailbox._sockets.get(sid) for sid in sids if isinstance(mailbox._sockets.get(sid), socket_context.Epollable)]
+                sockets = mailbox._sockets
+                self.__contexts = [sockets.get(sid) for sid in sids if isinstance(sockets.get(sid), socket_context.Epollable)]
                 for context in self.__contexts:
                     context.mutex.acquire()
                 return self.__contexts
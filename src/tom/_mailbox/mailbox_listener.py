@@ -1,42 +1,118 @@
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, Callable, Deque, List, Set, Tuple, Optional
+from collections import OrderedDict, deque
 import contextlib
+import dataclasses
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
 import email
 import os
+import pickle
+import time
 import threading
 import imapclient.response_types
 from .mailbox_tasks import MailboxTasks
-from .packet import Packet, PlainPacket, SecurePacket
+from .serial_executor import SerialExecutor
+from .imap_stats import IMAPStats
+from .packet import Packet, PlainPacket, SecurePacket, PacketBundle, AckSet, FastMessage
 from ..credential import Credential
+from ..endpoint import Endpoint
 from . import socket_context, imapclient
+import src.config
 
 
 class MailboxListener(MailboxTasks):
+    __credential: Credential
     __store: imapclient.IMAPClient
     __listener: imapclient.IMAPClient
     __mutex_listener: threading.RLock
-    __selfpipe: Tuple[int, int]
-    __thread_listener: threading.Thread
+    __selfpipe: Tuple[int, int]     # interrupts IDLE on closing or when the store session fails
+    __thread_listener: threading.Thread     # watches IDLE, requests fetches and reconnects failed sessions
+    __thread_fetcher: threading.Thread      # fetches and processes new emails
+    __cv_fetch: threading.Condition         # also protects `__store_failed` and `__stats`
+    __fetch_pending: bool           # whether new emails may have arrived since the last check started
+    __store_failed: bool            # whether the store session has failed and is yet to be reconnected
+    __stats: IMAPStats
+    __outage_start: float
+    __reconnect_delay: float        # delay before the first attempt of the next reconnection
+    __reconnect_time: float         # when the sessions were last reconnected
     __closed: bool = False
+    __state_file: Optional[str]
+    __uid_validity: Any
+    __last_uid: int                 # highest UID that has been examined
+    __retry_uids: Set[int]          # UIDs of packets not above `__last_uid` to examine again, never of other emails
+    __rejected: OrderedDict         # uid -> (reason, (to, from) or None, expiry), oldest first
+    __mutex_rejected: threading.Lock
+    __header_search: bool           # whether the server filters packets by headers
+    __binary_fetch: bool            # whether the server decodes bodies for us (RFC 3516)
+    __processed: Deque[Tuple[float, int]]   # [(time, uid)] of processed emails to collect, oldest first, if enabled
+    __mutex_store: threading.Lock
+    __parsers: ThreadPoolExecutor
+    __processors: SerialExecutor    # keyed by (local endpoint, remote endpoint) of packets
+    __CONTENT_TYPE_PREFIX: str = 'application/x-mailim-packet'
 
     @staticmethod
-    def __init_imap(credential: Credential) -> imapclient.IMAPClient:
-        imap = imapclient.IMAPClient(credential.host, credential.port, ssl=True, use_uid=True)
-        imap.login(credential.username, credential.password)
-        imap.select_folder('INBOX')
-        return imap
+    def __init_imap(credential: Credential, compress: bool) -> Tuple[imapclient.IMAPClient, Dict[bytes, Any]]:
+        imap = imapclient.IMAPClient(credential.host, credential.port, ssl=True, use_uid=True,
+                                     timeout=src.config.config['tom']['IMAPTimeout'] / 1000)
+        try:
+            imap.login(credential.username, credential.password)
+            if compress:
+                imap.compress()
+            info = imap.select_folder('INBOX')
+        except Exception:
+            MailboxListener.__disconnect(imap)
+            raise
+        return imap, info
 
-    def __init__(self, imap: Credential, **kwargs):
+    @staticmethod
+    def __disconnect(imap: imapclient.IMAPClient):
+        """
+        Close a session that may be dead without logging out, which would wait for the server.
+        """
+        with contextlib.suppress(Exception):
+            imap.shutdown()
+
+    def __init__(self, imap: Credential, state_file: Optional[str] = None, **kwargs):
         super().__init__(**kwargs)
-        self.__store = self.__init_imap(imap)
-        self.__listener = self.__init_imap(imap)
+        config = src.config.config['tom']
+        self.__credential = imap
+        self.__store, info = self.__init_imap(imap, config['IMAPCompress'])
+        self.__listener, _ = self.__init_imap(imap, config['IMAPCompressIdle'])
+        self.__state_file = state_file
+        self.__uid_validity = info.get(b'UIDVALIDITY')
+        self.__last_uid = 0
+        self.__retry_uids = set()
+        self.__rejected = OrderedDict()
+        self.__mutex_rejected = threading.Lock()
+        self.__header_search = True
+        self.__binary_fetch = b'BINARY' in self.__store.capabilities()
+        self.__processed = deque()
+        self.__mutex_store = threading.Lock()
+        self.__parsers = ThreadPoolExecutor(max_workers=src.config.config['tom']['InboundWorkers'])
+        self.__processors = SerialExecutor(src.config.config['tom']['InboundWorkers'])
+        self.__load_state()
+        if src.config.config['tom']['GCRetention'] is not None:
+            self._schedule_task(src.config.config['tom']['GCInterval'] / 1000, self.__task_collect_garbage)
         self.__mutex_listener = threading.RLock()
         self.__selfpipe = os.pipe()
+        os.set_blocking(self.__selfpipe[0], False)
+        self.__cv_fetch = threading.Condition()
+        self.__fetch_pending = True     # initial check
+        self.__store_failed = False
+        self.__stats = IMAPStats()
+        self.__reconnect_delay = 0
+        self.__reconnect_time = 0
+        self.__thread_fetcher = threading.Thread(target=self.__fetch)
+        self.__thread_fetcher.start()
         self.__thread_listener = threading.Thread(target=self.__listen)
         self.__thread_listener.start()
 
     def join(self):
         super().join()
         self.__thread_listener.join()
+        self.__thread_fetcher.join()
+        self.__parsers.shutdown()
+        self.__processors.shutdown()
 
     def close(self):
         with self._mutex:
@@ -44,46 +120,443 @@ class MailboxListener(MailboxTasks):
                 return
             self.__closed = True
         super().close()
-        os.close(self.__selfpipe[1])
+        with self.__cv_fetch:
+            # under `__cv_fetch` so that `__fail_store` never writes to a closed descriptor
+            os.close(self.__selfpipe[1])
+            self.__cv_fetch.notify_all()
+        # let the check in progress finish with the store connection
+        self.__thread_fetcher.join()
         with self.__mutex_listener:
-            self.__store.logout()
-            self.__listener.logout()
+            # sessions may have failed
+            with self.__mutex_store, contextlib.suppress(Exception):
+                self.__store.logout()
+            with contextlib.suppress(Exception):
+                self.__listener.logout()
         self.join()
 
     def __listen(self):
+        """
+        IDLE watcher thread body, which also supervises both IMAP sessions.
+
+        This only requests fetches from the fetcher thread, so notifications are observed however long processing
+        takes. When either session fails, both are reconnected and examination resumes after the last examined UID.
+        """
         with self.__mutex_listener:
-            self.__listener.idle()
-            self.__check_new_packets()
             while True:
-                responses = self.__listener.idle_check(selfpipe=self.__selfpipe[0])
+                try:
+                    self.__watch()
+                    if not self.__store_failed:  # closing
+                        return
+                except Exception:
+                    # the IDLE session is dead, including a server that stopped responding within `IMAPTimeout`
+                    pass
+                if self.__closed or not self.__reconnect():
+                    return
+
+    def __watch(self):
+        """
+        Watch IDLE until the selfpipe is triggered.
+
+        IDLE is restarted every `IdleRefresh` before servers time it out (RFC 2177), and whenever nothing has been heard
+        for `IdleWatchdog`. Each restart is a round trip that raises if the session is dead, and also requests a check
+        which does the same for the store session.
+        """
+        config = src.config.config['tom']
+        while True:
+            self.__listener.idle()
+            now = time.time()
+            refresh_time = now + config['IdleRefresh'] / 1000
+            probe_time = now + config['IdleWatchdog'] / 1000
+            while time.time() < min(refresh_time, probe_time):
+                timeout = min(refresh_time, probe_time) - time.time()
+                responses = self.__listener.idle_check(timeout, selfpipe=self.__selfpipe[0])
                 if responses is None:  # selfpipe triggered
                     self.__listener.idle_done()
                     return
-                if any(response[1] == b'EXISTS' for response in responses):
-                    self.__check_new_packets()
-            # TODO: handle exception
+                if responses:
+                    probe_time = time.time() + config['IdleWatchdog'] / 1000
+                exists = [response[0] for response in responses if response[1] == b'EXISTS']
+                if exists:
+                    if not self.__wait_more_exists(exists):
+                        self.__listener.idle_done()
+                        return
+                    self.__request_fetch()
+            self.__listener.idle_done()
+            self.__request_fetch()
+
+    def __reconnect(self) -> bool:
+        """
+        Replace both IMAP sessions with new ones, retrying with exponential backoff from `ReconnectDelay` up to
+        `MaxReconnectDelay`.
+
+        The first attempt is immediate, unless the sessions fail again within `MaxReconnectDelay` after the previous
+        reconnection, in which case the backoff continues from there.
+
+        Examination resumes after the last examined UID unless UIDs have been reassigned meanwhile.
+
+        :return: `False` if closed before reconnecting.
+        """
+        config = src.config.config['tom']
+        # also interrupts a check blocked on a dead store session
+        self.__disconnect(self.__store)
+        self.__disconnect(self.__listener)
+        with self.__cv_fetch:
+            self.__outage_start = time.time()
+            self.__stats.connected = False
+        delay = 0
+        if time.time() - self.__reconnect_time < config['MaxReconnectDelay'] / 1000:
+            delay = self.__reconnect_delay
+        while True:
+            with self.__cv_fetch:
+                if self.__cv_fetch.wait_for(lambda: self.__closed, delay):
+                    return False
+                self.__stats.reconnect_attempts += 1
+            try:
+                store, info = self.__init_imap(self.__credential, config['IMAPCompress'])
+                try:
+                    listener, _ = self.__init_imap(self.__credential, config['IMAPCompressIdle'])
+                except Exception:
+                    self.__disconnect(store)
+                    raise
+                break
+            except Exception:
+                delay = self.__backoff(delay)
+        self.__reconnect_delay = self.__backoff(delay)
+        self.__reconnect_time = time.time()
+        self.__listener = listener
+        with self.__mutex_store:
+            self.__store = store
+            self.__binary_fetch = b'BINARY' in store.capabilities()
+            if info.get(b'UIDVALIDITY') != self.__uid_validity:
+                # UIDs have been reassigned, rescan the mailbox
+                self.__uid_validity = info.get(b'UIDVALIDITY')
+                self.__last_uid = 0
+                self.__processed = deque()
+                with self.__mutex_rejected:
+                    self.__retry_uids = set()
+                    self.__rejected = OrderedDict()
+                self.__save_state()
+            # under `__mutex_store` so that failures of the new session are not cleared below
+            with self.__cv_fetch:
+                now = time.time()
+                self.__stats.connected = True
+                self.__stats.reconnects += 1
+                self.__stats.last_outage = now - self.__outage_start
+                self.__stats.total_outage += now - self.__outage_start
+                with contextlib.suppress(BlockingIOError):
+                    while os.read(self.__selfpipe[0], 4096):
+                        pass
+                self.__store_failed = False
+                # emails may have arrived during the outage
+                self.__fetch_pending = True
+                self.__cv_fetch.notify_all()
+        return True
+
+    @staticmethod
+    def __backoff(delay: float) -> float:
+        config = src.config.config['tom']
+        return min(max(delay * 2, config['ReconnectDelay'] / 1000), config['MaxReconnectDelay'] / 1000)
+
+    def __fail_store(self):
+        """
+        Have the listener thread reconnect after the store session failed, then check again. Must be called with
+        `__mutex_store` held.
+        """
+        with self.__cv_fetch:
+            if self.__closed:
+                return
+            self.__fetch_pending = True
+            if self.__store_failed:
+                return
+            self.__store_failed = True
+            os.write(self.__selfpipe[1], b'\0')
+
+    def imap_stats(self) -> IMAPStats:
+        """
+        :return: a snapshot of the health metrics of the IMAP sessions.
+        """
+        with self.__cv_fetch:
+            stats = dataclasses.replace(self.__stats)
+            if not stats.connected:
+                stats.total_outage += time.time() - self.__outage_start
+            return stats
+
+    def __request_fetch(self):
+        with self.__cv_fetch:
+            # requests arriving during a check are coalesced into the next one
+            self.__fetch_pending = True
+            self.__cv_fetch.notify_all()
+
+    def __fetch(self):
+        """
+        Fetcher thread body.
+
+        Pending requests are still served after closing, so that nothing notified before is left unexamined, unless the
+        store session has failed.
+        """
+        while True:
+            with self.__cv_fetch:
+                while (not self.__fetch_pending or self.__store_failed) and not self.__closed:
+                    self.__cv_fetch.wait()
+                if not self.__fetch_pending or self.__store_failed:
+                    return
+                self.__fetch_pending = False
+            self.__check_new_packets()
+
+    def __wait_more_exists(self, exists: List[int]) -> bool:
+        """
+        Keep collecting EXISTS notifications after the first one, so that a burst of emails is fetched in one batch.
+
+        Collecting ends early once no notification arrives for `FetchDebounceGap`, so a single email is fetched almost
+        immediately. Otherwise it ends when `FetchDebounce` has passed or `FetchBatchSize` new emails are notified.
+
+        :param exists: message counts in the notifications received so far.
+        :return: `False` if the selfpipe was triggered meanwhile.
+        """
+        config = src.config.config['tom']
+        deadline = time.time() + config['FetchDebounce'] / 1000
+        first, latest = min(exists), max(exists)
+        while latest - first + 1 < config['FetchBatchSize']:
+            timeout = min(config['FetchDebounceGap'] / 1000, deadline - time.time())
+            if timeout <= 0:
+                break
+            responses = self.__listener.idle_check(timeout, selfpipe=self.__selfpipe[0])
+            if responses is None:
+                return False
+            if not responses:  # quiet
+                break
+            latest = max([latest] + [response[0] for response in responses if response[1] == b'EXISTS'])
+        return True
 
     def __check_new_packets(self):
+        """
+        Examine, fetch and process new emails.
+
+        Emails not examined because of an error are examined again by the next check, which follows reconnecting if
+        the store session has failed.
+        """
+        with self.__mutex_store:
+            try:
+                self.__check_new_packets_locked()
+            except (imapclient.exceptions.IMAPClientAbortError, OSError):
+                self.__fail_store()
+            except Exception:
+                # e.g. an unexpected server response, which does not mean the session is dead
+                pass
+
+    def __check_new_packets_locked(self):
         self.__store.noop()
-        uids = self.__store.search('UNSEEN')
-        messages = self.__store.fetch(uids, ['BODY.PEEK[]'])
-        seens = []
+        uids = [uid for uid in self.__search_new_packets() if uid > self.__last_uid]
+        uids = self.__take_retry_uids() + uids
+        batch_size = src.config.config['tom']['FetchBatchSize']
+        try:
+            for i in range(0, len(uids), batch_size):
+                # bound memory usage and deliver early packets without waiting for the whole backlog
+                batch = uids[i:i+batch_size]
+                packet_uids = batch if self.__header_search else self.__filter_packet_headers(batch)
+                messages = self.__fetch_packets(packet_uids) if packet_uids else {}
+                seens = []
+                rejected = {}
+                results = self.__process_messages(list(messages.values()))
+                for uid, (processed, endpoints) in zip(messages.keys(), results):
+                    if processed:
+                        seens.append(uid)
+                    else:
+                        rejected[uid] = endpoints
+                if seens:
+                    self.__store.add_flags(seens, [imapclient.SEEN])
+                    if src.config.config['tom']['GCRetention'] is not None:
+                        now = time.time()
+                        self.__processed.extend((now, uid) for uid in seens)
+                with self.__mutex_rejected:
+                    for uid, endpoints in rejected.items():
+                        self.__reject(uid, endpoints)
+                self.__last_uid = max(self.__last_uid, batch[-1])
+                self.__save_state()
+        except Exception:
+            # examine the rest again after reconnecting, those above `__last_uid` are found by searching again
+            with self.__mutex_rejected:
+                self.__retry_uids.update(uid for uid in uids[i:] if uid <= self.__last_uid)
+            raise
+
+    def __task_collect_garbage(self):
+        """
+        Task body for removing processed packet emails whose retention period has passed.
+
+        Emails are moved to `GCArchiveFolder` if configured, otherwise deleted. Each run removes at most `GCBatchSize`
+        emails and the next run is scheduled immediately if there are more to remove.
+
+        Unless the server supports MOVE into `GCArchiveFolder`, expunging is needed, which is done only with UIDPLUS so
+        that it is limited to our own emails. Without it, emails are left flagged \\Deleted for the user's client to
+        expunge.
+        """
+        config = src.config.config['tom']
+        delay = config['GCInterval'] / 1000
+        try:
+            with self.__mutex_store:
+                if self.__closed:
+                    return
+                deadline = time.time() - config['GCRetention'] / 1000
+                uids = []
+                while self.__processed and self.__processed[0][0] <= deadline and len(uids) < config['GCBatchSize']:
+                    uids.append(self.__processed.popleft()[1])
+                if not uids:
+                    return
+                try:
+                    self.__collect_garbage(uids)
+                except Exception as e:
+                    # try again in the next run
+                    self.__processed.extendleft((deadline, uid) for uid in reversed(uids))
+                    if isinstance(e, (imapclient.exceptions.IMAPClientAbortError, OSError)):
+                        self.__fail_store()
+                    raise
+                self.__save_state()
+                if self.__processed and self.__processed[0][0] <= deadline:
+                    delay = 0
+        finally:
+            if not self.__closed:
+                self._schedule_task(delay, self.__task_collect_garbage)
+
+    def __collect_garbage(self, uids: List[int]):
+        folder = src.config.config['tom']['GCArchiveFolder']
+        if folder is not None:
+            if self.__store.has_capability('MOVE'):
+                self.__store.move(uids, folder)
+                return
+            self.__store.copy(uids, folder)
+        self.__store.delete_messages(uids)
+        if self.__store.has_capability('UIDPLUS'):
+            self.__store.expunge(uids)
+        # a plain EXPUNGE would also remove the user's own emails flagged \Deleted, so leave ours flagged instead
+
+    def __reject(self, uid: int, endpoints: Optional[Tuple[Endpoint, Endpoint]]):
+        config = src.config.config['tom']
+        reason = 'invalid' if endpoints is None else 'unroutable'
+        self.__rejected[uid] = (reason, endpoints, time.time() + config['RejectCacheTTL'] / 1000)
+        self.__rejected.move_to_end(uid)
+        while len(self.__rejected) > config['RejectCacheSize']:
+            # forgotten packets are recovered by retransmission from the remote
+            self.__rejected.popitem(last=False)
+
+    def __take_retry_uids(self) -> List[int]:
+        with self.__mutex_rejected:
+            now = time.time()
+            while self.__rejected:
+                uid, (reason, _, expiry) = next(iter(self.__rejected.items()))
+                if expiry > now:
+                    break
+                del self.__rejected[uid]
+                if reason == 'unroutable':
+                    self.__retry_uids.add(uid)
+            uids = sorted(self.__retry_uids)
+            self.__retry_uids = set()
+            return uids
+
+    def _reexamine_rejected(self, match: Callable[[Endpoint, Endpoint], bool]):
+        """
+        Examine rejected packets again with a new check if they may have become routable.
+
+        :param match: a function that decides whether a packet may be routed now, given the local and the remote
+        endpoint of the packet.
+        """
+        with self.__mutex_rejected:
+            uids = [uid
+                    for uid, (reason, endpoints, _) in self.__rejected.items()
+                    if reason == 'unroutable' and match(*endpoints)]
+            for uid in uids:
+                del self.__rejected[uid]
+            self.__retry_uids.update(uids)
+        if uids:
+            self.__request_fetch()
+
+    def __search_new_packets(self) -> List[int]:
+        # `n:*` matches the largest UID even if it is below n
+        criteria = ['UID', '{}:*'.format(self.__last_uid + 1), 'UNSEEN']
+        if self.__header_search:
+            try:
+                return self.__store.search(criteria + [
+                    'HEADER', 'X-Mailer', src.config.config['tom']['X-Mailer'],
+                    'HEADER', 'Content-Type', self.__CONTENT_TYPE_PREFIX,
+                ])
+            except imapclient.exceptions.IMAPClientError:
+                # header search not supported by the server, filter on downloaded headers instead
+                self.__header_search = False
+        return self.__store.search(criteria)
+
+    def __filter_packet_headers(self, uids: List[int]) -> List[int]:
+        messages = self.__store.fetch(uids, ['BODY.PEEK[HEADER.FIELDS (X-MAILER CONTENT-TYPE)]'])
+        ret = []
         for uid, message in messages.items():
-            if self.__try_process_packet(message):
-                seens.append(uid)
-        if seens:
-            self.__store.add_flags(seens, [imapclient.SEEN])
+            header = next((value for key, value in message.items() if key.startswith(b'BODY[HEADER.FIELDS')), b'')
+            msg = email.message_from_bytes(header)
+            if (msg.get('X-Mailer') == src.config.config['tom']['X-Mailer']
+                    and msg.get_content_type().startswith(self.__CONTENT_TYPE_PREFIX)):
+                ret.append(uid)
+        return ret
+
+    def __fetch_packets(self, uids: List[int]) -> Dict[int, Dict[bytes, Any]]:
+        if self.__binary_fetch:
+            # packets are single-part, so part 1 is the whole body
+            try:
+                return self.__store.fetch(uids, ['BODY.PEEK[HEADER]', 'BINARY.PEEK[1]'])
+            except imapclient.exceptions.IMAPClientError:
+                # e.g. [UNKNOWN-CTE] if any email in the batch cannot be decoded by the server
+                pass
+        return self.__store.fetch(uids, ['BODY.PEEK[]'])
+
+    def __load_state(self):
+        if self.__state_file is None or not os.path.exists(self.__state_file):
+            return
+        with open(self.__state_file, 'rb') as f:
+            state = pickle.load(f)
+        if state['uid_validity'] != self.__uid_validity:
+            # UIDs have been reassigned, rescan the mailbox
+            return
+        self.__last_uid = state['last_uid']
+        self.__retry_uids = state['pending_uids']
+        if src.config.config['tom']['GCRetention'] is not None:
+            self.__processed = deque(state.get('processed', []))
+
+    def __save_state(self):
+        if self.__state_file is None:
+            return
+        with self.__mutex_rejected:
+            # sockets do not survive restarts, so examine all unroutable packets again
+            pending_uids = self.__retry_uids | set(uid
+                                                   for uid, (reason, _, _) in self.__rejected.items()
+                                                   if reason == 'unroutable')
+        state = {
+            'uid_validity': self.__uid_validity,
+            'last_uid': self.__last_uid,
+            'pending_uids': pending_uids,
+        }
+        if src.config.config['tom']['GCRetention'] is not None:
+            # emails processed while collecting is disabled are kept
+            state['processed'] = list(self.__processed)
+        with open(self.__state_file + '.tmp', 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(self.__state_file + '.tmp', self.__state_file)
 
     def _process_packet_connected(self, sid: int, context: socket_context.Connected, packet: Packet):
         secure = isinstance(context, socket_context.SecureConnected)
+        acked_futures = []
         with context.cv:
+            if context.closed:
+                # shut down after being looked up
+                return False
             if secure:
                 packet: SecurePacket
                 context: socket_context.SecureConnected
                 packet = packet.decrypt(context.ratchet, context.xeddsa)
             packet: PlainPacket
-            for ack_seq, ack_attempt in packet.acks:
-                self.__process_ack(context, ack_seq, ack_attempt)
+            for begin, end, ack_attempt in AckSet(packet.acks).ranges():
+                if end - begin > len(context.attempts):
+                    # only look at unacked packets for large ranges
+                    ack_seqs = [seq for seq in context.attempts if begin <= seq < end]
+                else:
+                    ack_seqs = range(begin, end)
+                for ack_seq in ack_seqs:
+                    acked_futures += self.__process_ack(context, ack_seq, ack_attempt)
             if packet.seq != -1 and packet.seq >= context.recv_cursor[0]:
                 # no action for pure ack and duplicated packets
                 context.pending_remote[packet.seq] = packet.payload
@@ -99,82 +572,162 @@ class MailboxListener(MailboxTasks):
                 if context.pending_remote.get(seq):
                     self._socket_update_ready_status(sid, 'read', True)
                 elif secure and packet.seq == 0:  # handshake response
-                    del context.attempts[0]
-                    del context.pending_local[0]
+                    acked_futures += self.__process_ack(context, 0, 0)
                 context.syn_seq = None
                 context.cv.notify_all()
+        self._resolve_futures(acked_futures)
         return True
 
     def __try_process_packet_connected(self, packet: Packet, secure: bool) -> bool:
-        with self._mutex:
-            sid = self._connected_sockets.get((packet.to, packet.from_))
-            try:
-                context: socket_context.Connected = self._socket_check_status(sid, socket_context.Connected)
-            except Exception:
-                return False
-            if secure != isinstance(context, socket_context.SecureConnected):
-                return False
-            return self._process_packet_connected(sid, context, packet)
+        sid = self._connected_sockets.get((packet.to, packet.from_))
+        try:
+            context: socket_context.Connected = self._socket_check_status(sid, socket_context.Connected)
+        except Exception:
+            return False
+        if secure != isinstance(context, socket_context.SecureConnected):
+            return False
+        return self._process_packet_connected(sid, context, packet)
 
     def __try_process_packet_listening(self, packet: Packet, secure: bool) -> bool:
-        with self._mutex:
-            sid = next((sid
-                        for sid, listening_endpoint in self._listening_sockets.items()
-                        if listening_endpoint.matches(packet.to)), None)
-            try:
-                context: socket_context.Listening = self._socket_check_status(sid, socket_context.Listening)
-            except Exception:
+        sid = next((sid
+                    for sid, listening_endpoint in self._listening_sockets.items()
+                    if listening_endpoint.matches(packet.to)), None)
+        try:
+            context: socket_context.Listening = self._socket_check_status(sid, socket_context.Listening)
+        except Exception:
+            return False
+        with context.cv:
+            if context.closed:
                 return False
-            with context.cv:
-                conn_sid = context.connected_sockets.get((packet.to, packet.from_))
-                if conn_sid is not None:  # existing pending connection
-                    conn_context = context.sockets[conn_sid]
-                    if secure != isinstance(conn_context, socket_context.SecureConnected):
-                        return False
-                    conn_context.pending_packets.append(packet)
-                elif packet.is_syn:  # new connection
-                    conn_sid = self._socket_allocate_id()
-                    context.queue.append(conn_sid)
-                    context.connected_sockets[(packet.to, packet.from_)] = conn_sid
-                    self._socket_update_ready_status(sid, 'read', True)
-                    context.cv.notify_all()
-                    if secure:
-                        packet: SecurePacket
-                        conn_context = socket_context.SecureConnected(
-                            packet.to,
-                            packet.from_)
-                    else:
-                        conn_context = socket_context.Connected(
-                            packet.to,
-                            packet.from_)
-                    conn_context.pending_packets.append(packet)
-                    context.sockets[conn_sid] = conn_context
-                else:
+            conn_sid = context.connected_sockets.get((packet.to, packet.from_))
+            if conn_sid is not None:  # existing pending connection
+                conn_context = context.sockets[conn_sid]
+                if secure != isinstance(conn_context, socket_context.SecureConnected):
                     return False
-            return True
+                conn_context.pending_packets.append(packet)
+            elif packet.is_syn:  # new connection
+                conn_sid = self._socket_allocate_id()
+                context.queue.append(conn_sid)
+                context.connected_sockets[(packet.to, packet.from_)] = conn_sid
+                self._socket_update_ready_status(sid, 'read', True)
+                context.cv.notify_all()
+                if secure:
+                    packet: SecurePacket
+                    conn_context = socket_context.SecureConnected(
+                        packet.to,
+                        packet.from_)
+                else:
+                    conn_context = socket_context.Connected(
+                        packet.to,
+                        packet.from_)
+                conn_context.pending_packets.append(packet)
+                context.sockets[conn_sid] = conn_context
+            else:
+                return False
+        return True
 
     @staticmethod
-    def __try_parse_packet(msg: email.message.Message) -> Optional[Tuple[Packet, bool]]:
-        with contextlib.suppress(Exception):
-            return PlainPacket.from_message(msg), False
-        with contextlib.suppress(Exception):
-            return SecurePacket.from_message(msg), True
-        return None
+    def __try_parse_packet(msg: email.message.Message) -> Optional[Tuple[List[Packet], bool]]:
+        packet_cls = Packet.decoder_for(msg)
+        if packet_cls is None:
+            return None
+        try:
+            packet = packet_cls.from_message(msg)
+        except Exception:
+            return None
+        if isinstance(packet, PacketBundle):
+            return packet.packets, packet.secure
+        return [packet], isinstance(packet, SecurePacket)
+
+    @classmethod
+    def __parse_message(cls, message: Dict[bytes, Any]) -> Optional[Tuple[List[Packet], bool]]:
+        try:
+            # the full parser is only needed for emails altered in transit
+            if b'BINARY[1]' in message:
+                header, payload = message[b'BODY[HEADER]'], message[b'BINARY[1]']
+                msg = FastMessage.parse(header, payload) or cls.__message_from_binary(header, payload)
+            else:
+                data = message[b'BODY[]']
+                msg = FastMessage.parse(data) or email.message_from_bytes(data)
+        except Exception:
+            # e.g. an incomplete FETCH response, which is rejected as invalid rather than failing the whole batch
+            return None
+        return cls.__try_parse_packet(msg)
+
+    @staticmethod
+    def __message_from_binary(header: bytes, payload: bytes) -> email.message.Message:
+        msg = email.message_from_bytes(header)
+        # the server has undone the transfer encoding
+        del msg['Content-Transfer-Encoding']
+        msg['Content-Transfer-Encoding'] = 'binary'
+        msg.set_payload(payload)
+        return msg
+
+    def __process_messages(self, messages: List[Dict[bytes, Any]]) -> List[Tuple[bool, Optional[Tuple[Endpoint, Endpoint]]]]:
+        """
+        Process fetched messages.
 
-    def __try_process_packet(self, message: Dict[bytes, Any]) -> bool:
-        msg = email.message_from_bytes(message[b'BODY[]'])
-        ret = self.__try_parse_packet(msg)
-        return ret and bool(self.__try_process_packet_connected(*ret) or self.__try_process_packet_listening(*ret))
+        Messages are parsed in parallel. Packets are then processed in parallel across connections but in order within
+        each connection.
+
+        :param messages: fetched messages, in the order of arrival.
+        :return: for each message, whether it has been processed, and the local and remote endpoints of the packet or
+        `None` if the message is not a valid packet.
+        """
+        futures = []
+        for ret in self.__parsers.map(self.__parse_message, messages):
+            future = Future()
+            if ret is None:
+                future.set_result((False, None))
+            else:
+                packets, secure = ret
+                endpoints = packets[0].to, packets[0].from_
+                self.__processors.submit(
+                    functools.partial(self.__run_process_packets, future, packets, secure),
+                    endpoints)
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def __run_process_packets(self, future: Future, packets: List[Packet], secure: bool):
+        try:
+            future.set_result((self.__try_process_packets(packets, secure), (packets[0].to, packets[0].from_)))
+        except Exception:
+            # e.g. a forged secure packet that fails to decrypt, which is rejected as invalid
+            future.set_result((False, None))
+
+    def __try_process_packets(self, packets: List[Packet], secure: bool) -> bool:
+        # every packet in a bundle must be processed, so do not short-circuit
+        processed = [bool(self.__try_process_packet_connected(packet, secure)
+                          or self.__try_process_packet_listening(packet, secure))
+                     for packet in packets]
+        return any(processed)
         # TODO: check the seq range of packet
         # TODO: check if duplicated attempts of a packet are same
 
-    def __process_ack(self, context: socket_context.Connected, seq: int, attempt: int):
+    def __process_ack(self, context: socket_context.Connected, seq: int, attempt: int) -> List[Future]:
+        """
+        Process an ack. `context.cv` must be held.
+
+        :return: delivery futures of the acked packet, which are to be resolved with `_resolve_futures` after releasing
+        `context.cv`.
+        """
         total_attempts = context.attempts.get(seq)
         if total_attempts is None:
             # duplicated ack
-            return
+            return []
+        sent_time = context.sent_times.get((seq, attempt))
+        # secure packets do not carry attempts, so acks of retransmitted ones are ambiguous (Karn's rule)
+        if sent_time is not None and (total_attempts == 1 or not isinstance(context, socket_context.SecureConnected)):
+            self._update_rtt(context, time.time() - sent_time)
         del context.pending_local[seq]
+        futures = context.futures.pop(seq, [])
         context.to_ack -= context.sent_acks[(seq, attempt)]
         for i in range(total_attempts):
             del context.sent_acks[(seq, i)]
+            context.sent_times.pop((seq, i), None)
         del context.attempts[seq]
+        context.first_sent.pop(seq, None)
+        if not context.pending_local:
+            self._cancel_task(context.rto_task)
+            context.rto_task = None
+        return futures
@@ -1,29 +1,37 @@
 from typing import Optional, Callable, Union, Tuple
-import functools
 import time
 import pickle
+from concurrent.futures import Future
 import doubleratchet.header
 from .mailbox_listener import MailboxListener
 from . import socket_context
 from ..endpoint import Endpoint
-from .packet import SecurePacket, PlainPacket
+from .packet import SecurePacket, PlainPacket, EncodedPacket
+import src.config
 
 
 class MailboxSocketInterface(MailboxListener):
     def socket_create(self) -> int:
+        sid = self._socket_allocate_id()
         with self._mutex:
-            sid = self._socket_allocate_id()
-            self._sockets[sid] = socket_context.Created()
-            return sid
+            self._sockets = {**self._sockets, sid: socket_context.Created()}
+        return sid
 
     def socket_shutdown(self, sid: int):
+        self.__flush_before_shutdown(sid)
         self._socket_shutdown(sid)
 
     def socket_close(self, sid: int):
-        with self._mutex:
-            if self._sockets.get(sid):
-                self._socket_shutdown(sid)
-                self._sockets.pop(sid, None)
+        self.__flush_before_shutdown(sid)
+        if self._sockets.get(sid):
+            self._socket_shutdown(sid)
+            with self._mutex:
+                self._sockets = {k: v for k, v in self._sockets.items() if k != sid}
+
+    def __flush_before_shutdown(self, sid: int):
+        context = self._sockets.get(sid)
+        if isinstance(context, socket_context.Connected):
+            self._flush_send_buffer(sid, context)
 
     def socket_connect(
             self,
@@ -36,22 +44,23 @@ class MailboxSocketInterface(MailboxListener):
             self._socket_check_status(sid, socket_context.Created)
             if (local_endpoint, remote_endpoint) in self._connected_sockets:
                 raise Exception('address already in use')
-            self._connected_sockets[(local_endpoint, remote_endpoint)] = sid
             if sign_key_pair is not None:
                 context = socket_context.SecureConnected(local_endpoint, remote_endpoint, *sign_key_pair)
                 context.next_seq = 1
-                context.pending_local[0] = SecurePacket.encrypt(
+                context.pending_local[0] = EncodedPacket.encode(SecurePacket.encrypt(
                     PlainPacket(context.local_endpoint, context.remote_endpoint, 0, 0, set(), b'', is_syn=True),
                     context.ratchet,
-                    context.xeddsa)
+                    context.xeddsa))
             else:
                 context = socket_context.Connected(local_endpoint, remote_endpoint)
                 context.syn_seq = 0
-            self._sockets[sid] = context
+            self._sockets = {**self._sockets, sid: context}
+            self._connected_sockets = {**self._connected_sockets, (local_endpoint, remote_endpoint): sid}
+        self._reexamine_rejected(lambda to, from_: (to, from_) == (local_endpoint, remote_endpoint))
         if sign_key_pair is not None:
             ok = True
             with context.cv:
-                self._task_transmit(sid, context, 0)
+                self._task_transmit(sid, context, [0])
                 while 0 in context.pending_local and (timeout is None or timeout > 0):
                     start = time.time()
                     context.cv.wait(timeout)
@@ -71,8 +80,9 @@ class MailboxSocketInterface(MailboxListener):
             if any(local_endpoint.intersects_with(listening_endpoint)
                    for listening_endpoint in self._listening_sockets.values()):
                 raise Exception('address already in use')
-            self._listening_sockets[sid] = local_endpoint
-            self._sockets[sid] = socket_context.Listening(local_endpoint)
+            self._sockets = {**self._sockets, sid: socket_context.Listening(local_endpoint)}
+            self._listening_sockets = {**self._listening_sockets, sid: local_endpoint}
+        self._reexamine_rejected(lambda to, from_: local_endpoint.matches(to))
 
     def socket_accept(
             self,
@@ -118,7 +128,7 @@ class MailboxSocketInterface(MailboxListener):
                     packet = SecurePacket.encrypt(packet, conn_context.ratchet, conn_context.xeddsa)
                     conn_context.next_seq = 1
                     conn_context.recv_cursor = 1, 0
-                    conn_context.pending_local[0] = packet
+                    conn_context.pending_local[0] = EncodedPacket.encode(packet)
                 elif secure and type(decision) != bytes:
                     continue
                 else:  # plain or restore connection
@@ -140,42 +150,60 @@ class MailboxSocketInterface(MailboxListener):
                 if secure:
                     conn_context.handshaked = True
                 break
+        with context.cv:
+            if not context.queue:
+                self._socket_update_ready_status(sid, 'read', False)
         with self._mutex:
-            with context.cv:
-                if not context.queue:
-                    self._socket_update_ready_status(sid, 'read', False)
-            self._sockets[conn_sid] = conn_context
-            self._connected_sockets[(conn_context.local_endpoint, conn_context.remote_endpoint)] = conn_sid
-            if conn_context.pending_local:
-                for seq in conn_context.pending_local:
-                    self._schedule_task(0, functools.partial(self._task_transmit, conn_sid, conn_context, seq))
-            elif conn_context.to_ack:
-                self._schedule_ack(conn_sid, conn_context)
-            return conn_sid
+            self._sockets = {**self._sockets, conn_sid: conn_context}
+            self._connected_sockets = {
+                **self._connected_sockets,
+                (conn_context.local_endpoint, conn_context.remote_endpoint): conn_sid,
+            }
+        # packets arriving since the connection left the listening socket have been rejected
+        self._reexamine_rejected(
+            lambda to, from_: (to, from_) == (conn_context.local_endpoint, conn_context.remote_endpoint))
+        if conn_context.pending_local:
+            self._schedule_retransmit(conn_sid, conn_context, 0)
+        elif conn_context.to_ack:
+            self._schedule_ack(conn_sid, conn_context)
+        return conn_sid
 
     def socket_send(self, sid: int, buf: bytes) -> int:
+        return self.__send(sid, buf, None)
+
+    def socket_send_tracked(self, sid: int, buf: bytes) -> Future:
+        future = Future()
+        self.__send(sid, buf, future)
+        return future
+
+    def __send(self, sid: int, buf: bytes, future: Optional[Future]) -> int:
         context: socket_context.Connected = self._socket_check_status(sid, socket_context.Connected)
+        config = src.config.config['tom']
         with context.cv:
             if context.closed:
                 raise Exception('socket already closed')
-            seq = context.next_seq
-            context.next_seq += 1
-            packet = PlainPacket(
-                context.local_endpoint,
-                context.remote_endpoint,
-                seq,
-                0,
-                set(context.to_ack),
-                buf,
-                is_syn=seq == context.syn_seq)
-            if isinstance(context, socket_context.SecureConnected):
-                if not context.handshaked:
-                    raise Exception('unable to send data before handshake')
-                packet = SecurePacket.encrypt(packet, context.ratchet, context.xeddsa)
-            context.pending_local[seq] = packet
-        self._task_transmit(sid, context, seq)
+            if isinstance(context, socket_context.SecureConnected) and not context.handshaked:
+                raise Exception('unable to send data before handshake')
+            context.send_buffer += buf
+            if future is not None:
+                context.buffered_futures.append(future)
+            if context.nodelay or config['CoalesceDelay'] <= 0 or len(context.send_buffer) >= config['CoalesceSize']:
+                self._cancel_task(context.flush_task)
+                context.flush_task = None
+                self._queue_send_buffer(context)
+            else:
+                self._schedule_flush(sid, context)
+                return len(buf)
+        self._transmit_unsent(sid, context)
         return len(buf)
 
+    def socket_set_nodelay(self, sid: int, nodelay: bool):
+        context: socket_context.Connected = self._socket_check_status(sid, socket_context.Connected)
+        with context.cv:
+            context.nodelay = nodelay
+        if nodelay:
+            self._flush_send_buffer(sid, context)
+
     def socket_recv(self, sid: int, max_size: int, timeout: Optional[float] = None) -> bytes:
         context: socket_context.Connected = self._socket_check_status(sid, socket_context.Connected)
         with context.cv:
@@ -212,6 +240,8 @@ class MailboxSocketInterface(MailboxListener):
 
     def socket_dump(self, sid: int) -> bytes:
         context: socket_context.Connected = self._socket_check_status(sid, socket_context.Connected)
+        # buffered data is not part of the dump
+        self._flush_send_buffer(sid, context)
         with context.cv:
             return pickle.dumps(context)
 
@@ -220,16 +250,16 @@ class MailboxSocketInterface(MailboxListener):
         if not isinstance(context, socket_context.Connected):
             raise Exception('invalid socket dump: socket not connected')
         with self._mutex:
-            sid = self._socket_allocate_id()
             if (context.local_endpoint, context.remote_endpoint) in self._connected_sockets:
                 raise Exception('address already in use')
-            self._connected_sockets[(context.local_endpoint, context.remote_endpoint)] = sid
-            self._sockets[sid] = context
-            if context.pending_local:
-                for seq in context.pending_local:
-                    self._schedule_task(0, functools.partial(self._task_transmit, sid, context, seq))
-            elif context.to_ack:
-                self._schedule_ack(sid, context)
+            sid = self._socket_allocate_id()
+            self._sockets = {**self._sockets, sid: context}
+            self._connected_sockets = {**self._connected_sockets, (context.local_endpoint, context.remote_endpoint): sid}
+        if context.pending_local:
+            self._schedule_retransmit(sid, context, 0)
+        elif context.to_ack:
+            self._schedule_ack(sid, context)
+        self._reexamine_rejected(lambda to, from_: (to, from_) == (context.local_endpoint, context.remote_endpoint))
         return sid
 
     def socket_endpoints(self, sid: int) -> Tuple[Optional[Endpoint], Optional[Endpoint]]:
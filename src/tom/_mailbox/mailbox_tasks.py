@@ -1,44 +1,52 @@
-from typing import List, Tuple, Callable, Optional
+from typing import List, Tuple, Callable, Optional, Hashable, Iterator
 import math
 import heapq
+import itertools
 import functools
 import time
 import threading
-import smtplib
+from concurrent.futures import Future
 from .mailbox_base import MailboxBase
-from .packet import PlainPacket, SecurePacket
+from .smtp_pool import SMTPPool
+from .serial_executor import SerialExecutor
+from .scheduled_task import ScheduledTask
+from .packet import PlainPacket, SecurePacket, EncodedPacket, PacketBundle, AckSet
 from . import socket_context
 from ..credential import Credential
 import src.config
 
 
 class MailboxTasks(MailboxBase):
-    __transport: smtplib.SMTP
-    __mutex_transport: threading.RLock
-    __scheduled_tasks: List[Tuple[float, Callable]]
+    __transport: SMTPPool
+    __scheduled_tasks: List[Tuple[float, int, ScheduledTask]]     # [(deadline, tiebreaker, handle)]
+    __cancelled_tasks: int                                          # number of cancelled handles still in the heap
+    __task_counter: Iterator[int]
     __cv_tasks: threading.Condition
     __thread_timer: threading.Thread
+    __workers: SerialExecutor
     __closed: bool = False
+    __COMPACT_THRESHOLD = 64        # cancelled handles tolerated in the heap, so that small heaps are not rebuilt often
 
-    @staticmethod
-    def __init_smtp(credential: Credential) -> smtplib.SMTP:
-        smtp = smtplib.SMTP(credential.host, credential.port)
-        smtp.ehlo()
-        smtp.starttls()
-        smtp.login(credential.username, credential.password)
-        return smtp
-
-    def __init__(self, smtp: Credential):
+    def __init__(self, smtp: Credential, smtp_pool_size: Optional[int] = None):
         super().__init__()
-        self.__transport = self.__init_smtp(smtp)
-        self.__mutex_transport = threading.RLock()
+        config = src.config.config['tom']
+        self.__transport = SMTPPool(
+            smtp,
+            smtp_pool_size or config['SMTPPoolSize'],
+            config['SMTPIdleTimeout'] / 1000,
+            config['SMTPHealthCheck'] / 1000)
         self.__scheduled_tasks = []
+        self.__cancelled_tasks = 0
+        self.__task_counter = itertools.count()
         self.__cv_tasks = threading.Condition()
+        self.__workers = SerialExecutor(config['TaskWorkers'])
         self.__thread_timer = threading.Thread(target=self.__timer)
         self.__thread_timer.start()
+        self._schedule_task(config['SMTPIdleTimeout'] / 1000, self.__task_reap_transport)
 
     def join(self):
         self.__thread_timer.join()
+        self.__workers.shutdown()
 
     def close(self):
         with self.__cv_tasks:
@@ -47,10 +55,13 @@ class MailboxTasks(MailboxBase):
         self.__transport.close()
 
     def __timer(self):
-        while True:
-            with self.__cv_tasks:
-                if self.__closed:
-                    break
+        """
+        Timer thread body.
+
+        This only dispatches due tasks to the worker pool so that slow tasks do not delay other deadlines.
+        """
+        with self.__cv_tasks:
+            while True:
                 while not self.__closed and (not self.__scheduled_tasks or self.__scheduled_tasks[0][0] > time.time()):
                     if self.__scheduled_tasks:
                         self.__cv_tasks.wait(self.__scheduled_tasks[0][0] - time.time())
@@ -58,90 +69,371 @@ class MailboxTasks(MailboxBase):
                         self.__cv_tasks.wait()
                 if self.__closed:
                     break
-                _, task = heapq.heappop(self.__scheduled_tasks)
-            try:
-                task()
-            except Exception:
-                # TODO: exception handling for scheduled tasks
-                pass
+                now = time.time()
+                while self.__scheduled_tasks and self.__scheduled_tasks[0][0] <= now:
+                    _, _, handle = heapq.heappop(self.__scheduled_tasks)
+                    if handle.cancelled:
+                        self.__cancelled_tasks -= 1
+                        continue
+                    task, handle.task = handle.task, None
+                    self.__workers.submit(task, handle.key)
 
-    def _schedule_task(self, delay: float, task: Callable):
+    def __task_reap_transport(self):
+        """
+        Task body for closing idle SMTP sessions, which would otherwise stay open until the next email is sent.
+        """
+        self.__transport.reap()
+        if not self.__closed:
+            self._schedule_task(src.config.config['tom']['SMTPIdleTimeout'] / 1000, self.__task_reap_transport)
+
+    def _schedule_task(self, delay: float, task: Callable, key: Optional[Hashable] = None) -> ScheduledTask:
         """
         Schedule a new task.
 
         :param delay: the scheduled time to execute in seconds, counting from current time.
         :param task: the function to execute.
+        :param key: tasks with the same key never run concurrently and run in the order they become due. Typically
+        the socket context the task operates on.
+        :return: a handle that can be passed to `_cancel_task`.
         """
         with self.__cv_tasks:
-            heapq.heappush(self.__scheduled_tasks, (time.time() + delay, task))
+            handle = ScheduledTask(time.time() + delay, task, key)
+            heapq.heappush(self.__scheduled_tasks, (handle.deadline, next(self.__task_counter), handle))
             self.__cv_tasks.notify_all()
+            return handle
+
+    def _cancel_task(self, handle: Optional[ScheduledTask]):
+        """
+        Cancel a scheduled task. No actions will be taken if the task has been cancelled or dispatched.
+
+        Cancelled tasks are dropped lazily; the heap is rebuilt once they make up more than half of it.
+
+        :param handle: a handle returned by `_schedule_task`, or None.
+        """
+        if handle is None:
+            return
+        with self.__cv_tasks:
+            if not handle.pending:
+                return
+            handle.task = None
+            handle.cancelled = True
+            self.__cancelled_tasks += 1
+            if self.__cancelled_tasks > self.__COMPACT_THRESHOLD \
+                    and self.__cancelled_tasks * 2 > len(self.__scheduled_tasks):
+                self.__scheduled_tasks = [entry for entry in self.__scheduled_tasks if not entry[2].cancelled]
+                heapq.heapify(self.__scheduled_tasks)
+                self.__cancelled_tasks = 0
+
+    def _cancel_socket_tasks(self, context: socket_context.Connected):
+        """
+        Cancel all timers of a connected socket.
+
+        :param context: a connected socket context.
+        """
+        with context.cv:
+            self._cancel_task(context.rto_task)
+            context.rto_task = None
+            self._cancel_task(context.ack_task)
+            context.ack_task = None
+            self._cancel_task(context.flush_task)
+            context.flush_task = None
+
+    def _socket_shutdown(self, sid: int):
+        super()._socket_shutdown(sid)
+        context = self._sockets.get(sid)
+        if isinstance(context, socket_context.Connected):
+            self._cancel_socket_tasks(context)
+            with context.cv:
+                futures = self._take_socket_futures(context)
+            self._resolve_futures(futures, Exception('socket already closed'))
 
     def _schedule_ack(self, sid: int, context: socket_context.Connected):
         with context.cv:
             if context.ack_scheduled:
                 return
             context.ack_scheduled = True
-            self._schedule_task(
+            context.ack_task = self._schedule_task(
                 src.config.config['tom']['ATO'] / 1000,
-                functools.partial(self._task_send_ack, sid, context, context.next_seq))
+                functools.partial(self._task_send_ack, sid, context, context.next_seq),
+                context)
+
+    @staticmethod
+    def _rto(context: socket_context.Connected) -> float:
+        """
+        Get the current retransmission timeout of a socket, before backoff.
+
+        :param context: a connected socket context.
+        :return: the retransmission timeout in seconds.
+        """
+        config = src.config.config['tom']
+        if context.srtt is None:
+            return config['RTO'] / 1000
+        # RFC 6298, with negligible clock granularity
+        rto = context.srtt + 4 * context.rttvar
+        return min(max(rto, config['MinRTO'] / 1000), config['MaxRTO'] / 1000)
+
+    @staticmethod
+    def _update_rtt(context: socket_context.Connected, rtt: float):
+        """
+        Feed a round-trip time sample to the RTT estimator of a socket (RFC 6298).
+
+        Only samples that can be unambiguously attributed to a single transmission attempt may be used (Karn's rule).
+
+        :param context: a connected socket context.
+        :param rtt: the round-trip time in seconds.
+        """
+        if context.srtt is None:
+            context.srtt = rtt
+            context.rttvar = rtt / 2
+        else:
+            context.rttvar = 0.75 * context.rttvar + 0.25 * abs(context.srtt - rtt)
+            context.srtt = 0.875 * context.srtt + 0.125 * rtt
+
+    @staticmethod
+    def __retransmit_deadline(context: socket_context.Connected, seq: int, rto: float) -> float:
+        """
+        Get the time at which a pending packet is due for retransmission or giving up.
+
+        The timeout doubles with every retransmission of the packet.
+
+        :param context: a connected socket context.
+        :param seq: seq number of the packet.
+        :param rto: the current RTO of the socket.
+        :return: the due time.
+        """
+        config = src.config.config['tom']
+        attempts = context.attempts.get(seq, 0)
+        last_sent = context.sent_times.get((seq, attempts - 1))
+        if last_sent is None:  # never transmitted since restored
+            return -math.inf
+        first_sent, first_attempt = context.first_sent[seq]
+        timeout = min(rto * 2 ** (attempts - 1 - first_attempt), config['MaxRTO'] / 1000)
+        return min(last_sent + timeout, first_sent + config['MaxRetransmitTime'] / 1000)
+
+    def _schedule_retransmit(self, sid: int, context: socket_context.Connected, delay: Optional[float] = None):
+        """
+        Arm the retransmission timer of a socket unless it is already armed.
+
+        Each connected socket has at most one retransmission timer, which expires RTO after the earliest transmission
+        of any unacked packet.
+
+        :param sid: socket id
+        :param context: a connected socket context.
+        :param delay: an explicit delay in seconds. Omit to derive it from the earliest transmission.
+        """
+        with context.cv:
+            if context.closed or context.rto_task is not None or not context.pending_local:
+                return
+            if delay is None:
+                rto = self._rto(context)
+                delay = min(self.__retransmit_deadline(context, seq, rto) for seq in context.pending_local) - time.time()
+            context.rto_task = self._schedule_task(
+                delay,
+                functools.partial(self._task_retransmit, sid, context),
+                context)
+
+    def _task_retransmit(self, sid: int, context: socket_context.Connected):
+        """
+        Task body for the retransmission timer.
 
-    def _task_transmit(self, sid: Optional[int], context: socket_context.Connected, seq: int):
+        This will retransmit, oldest first, every unacked packet that has timed out or has never been transmitted, and
+        then re-arm the timer.
+
+        :param sid: socket id
+        :param context: a connected socket context.
+        """
+        with context.cv:
+            if context.closed:
+                return
+            now = time.time()
+            rto = self._rto(context)
+            seqs = sorted(seq
+                          for seq in context.pending_local
+                          if self.__retransmit_deadline(context, seq, rto) <= now)
+        self._task_transmit(sid, context, seqs)
+        with context.cv:
+            if context.rto_task is not None and not context.rto_task.pending:  # this task
+                context.rto_task = None
+            self._schedule_retransmit(sid, context)
+
+    def _queue_send_buffer(self, context: socket_context.Connected):
+        """
+        Assign a new seq number to the data in `context.send_buffer` and queue it for transmission as a single segment.
+        `context.cv` must be held.
+
+        :param context: a connected socket context.
+        """
+        seq = context.next_seq
+        context.next_seq += 1
+        packet = PlainPacket(
+            context.local_endpoint,
+            context.remote_endpoint,
+            seq,
+            0,
+            AckSet(context.to_ack),
+            context.send_buffer,
+            is_syn=seq == context.syn_seq)
+        if isinstance(context, socket_context.SecureConnected):
+            packet = SecurePacket.encrypt(packet, context.ratchet, context.xeddsa)
+        context.pending_local[seq] = EncodedPacket.encode(packet)
+        context.unsent.append(seq)
+        if context.buffered_futures:
+            context.futures[seq] = context.buffered_futures
+            context.buffered_futures = []
+        context.send_buffer = b''
+
+    @staticmethod
+    def _take_socket_futures(context: socket_context.Connected) -> List[Future]:
+        """
+        Remove all delivery futures of a socket, which are to be failed with `_resolve_futures`. `context.cv` must be
+        held.
+
+        :param context: a connected socket context.
+        :return: the removed futures.
+        """
+        futures = list(context.buffered_futures)
+        for seq_futures in context.futures.values():
+            futures += seq_futures
+        context.futures = {}
+        context.buffered_futures = []
+        return futures
+
+    @staticmethod
+    def _resolve_futures(futures: List[Future], exception: Optional[Exception] = None):
         """
-        Task body for transmitting a packet.
+        Resolve delivery futures, skipping those cancelled by applications. `context.cv` must not be held, since this
+        runs callbacks of applications.
 
-        This will initiate a new transmission attempt of the specified seq number and schedule a timeout retransmission,
-        with some exceptions:
+        :param futures: futures removed from a socket context.
+        :param exception: the exception to fail the futures with, or `None` to resolve them successfully.
+        """
+        for future in futures:
+            # from here on `cancel` fails, so resolving never races with it
+            if not future.set_running_or_notify_cancel():
+                continue
+            if exception is None:
+                future.set_result(None)
+            else:
+                future.set_exception(exception)
+
+    def _schedule_flush(self, sid: int, context: socket_context.Connected):
+        """
+        Arm the coalescing timer of a socket unless it is already armed. `context.cv` must be held.
+
+        :param sid: socket id
+        :param context: a connected socket context.
+        """
+        if context.flush_task is None:
+            context.flush_task = self._schedule_task(
+                src.config.config['tom']['CoalesceDelay'] / 1000,
+                functools.partial(self._flush_send_buffer, sid, context),
+                context)
+
+    def _flush_send_buffer(self, sid: int, context: socket_context.Connected):
+        """
+        Send data buffered by coalescing as a single segment.
+
+        This is also the task body for the coalescing timer.
+
+        :param sid: socket id
+        :param context: a connected socket context.
+        """
+        with context.cv:
+            self._cancel_task(context.flush_task)
+            context.flush_task = None
+            if context.closed or not context.send_buffer:
+                return
+            self._queue_send_buffer(context)
+        self._transmit_unsent(sid, context)
+
+    def _transmit_unsent(self, sid: int, context: socket_context.Connected):
+        """
+        Transmit packets queued in `context.unsent`.
+
+        If another thread is already transmitting for the socket, this returns immediately and packets will be picked
+        up by that thread once its current email has been sent, so that packets queued in the meantime share emails.
+
+        :param sid: socket id
+        :param context: a connected socket context.
+        """
+        with context.cv:
+            if context.transmitting:
+                return
+            context.transmitting = True
+        try:
+            while True:
+                with context.cv:
+                    seqs, context.unsent = context.unsent, []
+                    if not seqs:
+                        break
+                self._task_transmit(sid, context, seqs)
+        finally:
+            with context.cv:
+                context.transmitting = False
+
+    def _task_transmit(self, sid: Optional[int], context: socket_context.Connected, seqs: List[int]):
+        """
+        Task body for transmitting packets.
+
+        This will initiate a new transmission attempt of each of the specified seq numbers, packing them into as few
+        emails as `MaxBundleSize` allows, and arm the retransmission timer, with some exceptions:
         1. If the socket has been closed, no actions will be taken.
-        2. If the specified seq number has been ACKed from the remote, no actions will be taken.
+        2. Seq numbers that have been ACKed from the remote will be skipped.
         3. If a pure ACK is executed but there is no packet to ACK, no actions will be taken.
         4. If a pure ACK is executed, no retransmission will be scheduled.
+        5. If any packet has been unacked for `MaxRetransmitTime`, the socket will be closed instead.
 
         :param sid: socket id
         :param context: a connected socket context.
-        :param seq: seq number of the packet to transmit.
+        :param seqs: seq numbers of the packets to transmit, or `[-1]` for a pure ACK.
         """
+        config = src.config.config['tom']
         with context.cv:
             if context.closed:
                 return
-            acks = set(context.to_ack)
+            acks = AckSet(context.to_ack)
             local_endpoint, remote_endpoint = context.local_endpoint, context.remote_endpoint
-            if seq == -1:
+            packets = []
+            if seqs == [-1]:
                 if not acks:  # nothing to ack
                     return
-                packet: PlainPacket = PlainPacket(context.local_endpoint, context.remote_endpoint, seq, 0, acks, b'')
+                packet: PlainPacket = PlainPacket(context.local_endpoint, context.remote_endpoint, -1, 0, acks, b'')
                 if isinstance(context, socket_context.SecureConnected):
                     packet = SecurePacket.encrypt(packet, context.ratchet, context.xeddsa)
-            elif not seq in context.pending_local:
-                # already acked
-                return
+                packets.append(packet)
             else:
-                attempt = context.attempts[seq]
-                if attempt >= src.config.config['tom']['MaxAttempts']:
-                    # avoid acquiring mailbox mutex while holding context.cv
-                    self._schedule_task(-math.inf, functools.partial(self._task_close_socket, sid))
-                    return
-                elif isinstance(context, socket_context.SecureConnected):
+                now = time.time()
+                for seq in seqs:
+                    if not seq in context.pending_local:
+                        # already acked
+                        continue
+                    attempt = context.attempts[seq]
+                    first_sent, _ = context.first_sent.setdefault(seq, (now, attempt))
+                    if now - first_sent >= config['MaxRetransmitTime'] / 1000:
+                        # avoid acquiring mailbox mutex while holding context.cv
+                        self._schedule_task(-math.inf, functools.partial(self._task_close_socket, sid))
+                        return
+                    context.sent_times[(seq, attempt)] = now
                     context.attempts[seq] += 1
                     context.sent_acks[(seq, attempt)] = acks
-                    packet: SecurePacket = context.pending_local[seq]
-                else:
-                    context.attempts[seq] += 1
-                    context.sent_acks[(seq, attempt)] = acks
-                    packet: PlainPacket = context.pending_local[seq]
-                    packet = PlainPacket(
-                        packet.from_,
-                        packet.to,
-                        seq,
-                        attempt,
-                        acks,
-                        packet.payload,
-                        packet.is_syn)
-            msg = packet.to_message()
+                    packets.append(context.pending_local[seq].for_attempt(attempt, acks))
+                if not packets:
+                    return
+            # acks are carried by these packets
             context.ack_scheduled = False
-        with self.__mutex_transport:
-            self.__transport.sendmail(local_endpoint.address, remote_endpoint.address, msg.as_bytes())
-        if seq != -1:  # do not retransmit pure acks
-            self._schedule_task(src.config.config['tom']['RTO'] / 1000, functools.partial(self._task_transmit, sid, context, seq))
+            self._cancel_task(context.ack_task)
+            context.ack_task = None
+        try:
+            with self.__transport.session() as transport:
+                binary = SMTPPool.binary(transport)
+                if config['PacketBundles']:
+                    packets = PacketBundle.pack(packets, config['MaxBundleSize'])
+                for packet in packets:
+                    SMTPPool.send(
+                        transport, local_endpoint.address, remote_endpoint.address, packet.to_bytes(binary), binary)
+        finally:
+            if seqs != [-1]:  # do not retransmit pure acks
+                self._schedule_retransmit(sid, context)
 
     def _task_send_ack(self, sid: int, context: socket_context.Connected, next_seq: int):
         """
@@ -158,8 +450,14 @@ class MailboxTasks(MailboxBase):
             if context.closed or context.next_seq != next_seq:
                 # another packet carrying ack has been sent
                 return
-            # pure ack does not consume seq number
-            self._task_transmit(sid, context, -1)
+        # pure ack does not consume seq number
+        # do not hold context.cv while talking to SMTP, which would block incoming packets of this socket
+        self._task_transmit(sid, context, [-1])
 
     def _task_close_socket(self, sid: int):
+        context = self._sockets.get(sid)
+        if isinstance(context, socket_context.Connected):
+            with context.cv:
+                futures = self._take_socket_futures(context)
+            self._resolve_futures(futures, Exception('connection timed out: packets unacked for too long'))
         self._socket_shutdown(sid)
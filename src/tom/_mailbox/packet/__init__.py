@@ -1,5 +1,9 @@
 from .packet import Packet
+from .fast_message import FastMessage
+from .ack_set import AckSet
 from .plain_packet import PlainPacket
 from .secure_packet import SecurePacket
+from .encoded_packet import EncodedPacket
+from .packet_bundle import PacketBundle
 
-__all__ = ['Packet', 'PlainPacket', 'SecurePacket']
+__all__ = ['Packet', 'FastMessage', 'AckSet', 'PlainPacket', 'SecurePacket', 'EncodedPacket', 'PacketBundle']
@@ -0,0 +1,172 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Iterator, List, Tuple
+from collections.abc import MutableSet
+from bisect import bisect_left, bisect_right
+from . import packet_pb2
+
+
+class AckSet(MutableSet):
+    """
+    A set of packet ids `(seq, attempt)` stored as ranges of consecutive seq numbers with the same attempt.
+
+    Memory usage and the cost of copying and subtracting grow with the number of gaps rather than the number of ids.
+    """
+
+    __ranges: Dict[int, Tuple[List[int], List[int]]]  # attempt -> ([begin], [end]), sorted and disjoint
+    __len: int
+
+    def __init__(self, ids: Iterable[Tuple[int, int]] = ()):
+        """
+        :param ids: packet ids `(seq, attempt)` to initialize the set with.
+        """
+        self.__ranges = {}
+        self.__len = 0
+        if isinstance(ids, AckSet):
+            for begin, end, attempt in ids.ranges():
+                self.add_range(begin, end, attempt)
+        else:
+            for id in ids:
+                self.add(id)
+
+    def __contains__(self, id: Tuple[int, int]) -> bool:
+        seq, attempt = id
+        ranges = self.__ranges.get(attempt)
+        if ranges is None:
+            return False
+        begins, ends = ranges
+        i = bisect_right(begins, seq)
+        return i > 0 and ends[i - 1] > seq
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        for begin, end, attempt in self.ranges():
+            for seq in range(begin, end):
+                yield seq, attempt
+
+    def __len__(self) -> int:
+        return self.__len
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, AckSet):
+            return self.__ranges == other.__ranges
+        return super().__eq__(other)
+
+    def __repr__(self) -> str:
+        return 'AckSet({})'.format(list(self.ranges()))
+
+    def __isub__(self, other: Iterable[Tuple[int, int]]) -> AckSet:
+        if isinstance(other, AckSet):
+            for begin, end, attempt in other.ranges():
+                self.discard_range(begin, end, attempt)
+        else:
+            for id in other:
+                self.discard(id)
+        return self
+
+    def ranges(self) -> Iterator[Tuple[int, int, int]]:
+        """
+        :return: an iterator of `(begin, end, attempt)` for maximal ranges of ids `(seq, attempt)` where
+        `begin <= seq < end`, ordered by attempt and then seq.
+        """
+        for attempt in sorted(self.__ranges):
+            begins, ends = self.__ranges[attempt]
+            yield from ((begin, end, attempt) for begin, end in zip(begins, ends))
+
+    def add(self, id: Tuple[int, int]):
+        seq, attempt = id
+        self.add_range(seq, seq + 1, attempt)
+
+    def discard(self, id: Tuple[int, int]):
+        seq, attempt = id
+        self.discard_range(seq, seq + 1, attempt)
+
+    def add_range(self, begin: int, end: int, attempt: int):
+        """
+        Add ids `(seq, attempt)` for `begin <= seq < end`.
+        """
+        if begin >= end:
+            return
+        begins, ends = self.__ranges.setdefault(attempt, ([], []))
+        i = bisect_left(ends, begin)    # first range overlapping or adjacent to the new one
+        j = bisect_right(begins, end)   # past the last range overlapping or adjacent to the new one
+        removed = 0
+        if i < j:
+            removed = sum(ends[k] - begins[k] for k in range(i, j))
+            begin = min(begin, begins[i])
+            end = max(end, ends[j - 1])
+        begins[i:j] = [begin]
+        ends[i:j] = [end]
+        self.__len += end - begin - removed
+
+    def discard_range(self, begin: int, end: int, attempt: int):
+        """
+        Remove ids `(seq, attempt)` for `begin <= seq < end` if present.
+        """
+        ranges = self.__ranges.get(attempt)
+        if ranges is None or begin >= end:
+            return
+        begins, ends = ranges
+        i = bisect_right(ends, begin)   # first range overlapping the removed one
+        j = bisect_left(begins, end)    # past the last range overlapping the removed one
+        if i >= j:
+            return
+        self.__len -= sum(min(ends[k], end) - max(begins[k], begin) for k in range(i, j))
+        new_begins, new_ends = [], []
+        if begins[i] < begin:
+            new_begins.append(begins[i])
+            new_ends.append(begin)
+        if ends[j - 1] > end:
+            new_begins.append(end)
+            new_ends.append(ends[j - 1])
+        begins[i:j] = new_begins
+        ends[i:j] = new_ends
+        if not begins:
+            del self.__ranges[attempt]
+
+    def copy(self) -> AckSet:
+        return AckSet(self)
+
+    @classmethod
+    def from_pb(cls, ids: Iterable[packet_pb2.PacketId], ranges: Iterable[packet_pb2.AckRange]) -> AckSet:
+        """
+        :param ids: acks in the legacy format of one `PacketId` per packet.
+        :param ranges: acks in the range format.
+        """
+        self = cls((id.seq, id.attempt) for id in ids)
+        for range_ in ranges:
+            self.add_range(range_.begin, range_.end, range_.attempt)
+        return self
+
+    def to_legacy_pb(self) -> List[packet_pb2.PacketId]:
+        """
+        :return: acks in the legacy format of one `PacketId` per packet, ordered as peers before ack ranges did when
+        signing, i.e. by iterating a `set`.
+        """
+        ret = []
+        for seq, attempt in set(self):
+            id = packet_pb2.PacketId()
+            id.seq = seq
+            id.attempt = attempt
+            ret.append(id)
+        return ret
+
+    def write_pb(self, header, legacy: bool):
+        """
+        Write the acks into the `acks` or `ack_ranges` field of a packet header.
+
+        :param header: a `packet_pb2.PlainPacketHeader` or `packet_pb2.SecurePacketHeader`.
+        :param legacy: whether to use the legacy format, which peers before ack ranges read, see `LegacyAcks`.
+        """
+        if legacy:
+            header.acks.extend(self.to_legacy_pb())
+        else:
+            header.ack_ranges.extend(self.to_pb())
+
+    def to_pb(self) -> List[packet_pb2.AckRange]:
+        ret = []
+        for begin, end, attempt in self.ranges():
+            range_ = packet_pb2.AckRange()
+            range_.begin = begin
+            range_.end = end
+            range_.attempt = attempt
+            ret.append(range_)
+        return ret
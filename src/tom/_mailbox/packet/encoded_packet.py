@@ -0,0 +1,44 @@
+from __future__ import annotations
+from typing import AbstractSet, Tuple, Union
+from dataclasses import dataclass
+from . import packet_pb2, Packet, PlainPacket, SecurePacket
+from .ack_set import AckSet
+import src.config
+
+
+@dataclass()
+class EncodedPacket(Packet):
+    """
+    A packet awaiting ack, kept serialized so that retransmissions do not encode it again.
+
+    Secure packets are kept exactly as sent, since their acks are signed. Plain packets are kept without acks and
+    attempt, which `for_attempt` patches in.
+    """
+
+    secure: bool
+    data: bytes             # serialized `packet_pb2.SecurePacket` or `packet_pb2.PlainPacket`
+    payload_size: int       # as `PacketBundle.payload_size` of the original packet
+
+    @classmethod
+    def encode(cls, packet: Union[PlainPacket, SecurePacket]) -> EncodedPacket:
+        if isinstance(packet, SecurePacket):
+            return cls(packet.from_, packet.to, True, packet.to_pb().SerializeToString(), len(packet.body))
+        packet = PlainPacket(packet.from_, packet.to, packet.seq, 0, AckSet(), packet.payload, packet.is_syn)
+        return cls(packet.from_, packet.to, False, packet.to_pb().SerializeToString(), len(packet.payload))
+
+    def for_attempt(self, attempt: int, acks: AbstractSet[Tuple[int, int]]) -> EncodedPacket:
+        """
+        :param attempt: the transmission attempt.
+        :param acks: the acks to piggyback, which are ignored by secure packets.
+        :return: the packet to send for the attempt.
+        """
+        if self.secure:
+            return self
+        patch = packet_pb2.PlainPacket()
+        AckSet(acks).write_pb(patch.header, src.config.config['tom']['LegacyAcks'])
+        patch.body.id.attempt = attempt
+        # concatenated protobuf messages are parsed as if merged, with later singular fields taking precedence
+        return EncodedPacket(self.from_, self.to, False, self.data + patch.SerializeToString(), self.payload_size)
+
+    def _content(self) -> Tuple[str, bytes]:
+        return 'application/x-mailim-packet-secure' if self.secure else 'application/x-mailim-packet', self.data
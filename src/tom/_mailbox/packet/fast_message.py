@@ -0,0 +1,137 @@
+from __future__ import annotations
+from typing import Dict, Optional
+import binascii
+import email.message
+from email.utils import formataddr
+from ... import Endpoint
+
+
+class FastMessage:
+    """
+    A single-part base64 or binary email in the layout emitted by Mail.im, encoded and decoded without the `email`
+    package.
+
+    It implements the subset of `email.message.Message` used by packet parsers. Anything outside the fixed layout is
+    left to the full parser.
+    """
+
+    __MAX_LINE_LENGTH = 78      # longer headers would be folded by the `email` package
+
+    __headers: Dict[str, str]   # lower-cased name -> value of the first occurrence
+    __payload: bytes            # decoded body
+
+    def __init__(self, headers: Dict[str, str], payload: bytes):
+        self.__headers = headers
+        self.__payload = payload
+
+    def get(self, name: str, failobj=None) -> Optional[str]:
+        return self.__headers.get(name.lower(), failobj)
+
+    def get_content_type(self) -> str:
+        return self.__headers['content-type']
+
+    def get_payload(self, decode: bool = False):
+        if not decode:
+            return binascii.b2a_base64(self.__payload).decode('ascii')
+        return self.__payload
+
+    @classmethod
+    def parse(cls, data: bytes, payload: Optional[bytes] = None) -> Optional[FastMessage]:
+        """
+        :param data: the raw email, or only its header if `payload` is given.
+        :param payload: the body already decoded by the server, e.g. by `BINARY[1]` (RFC 3516).
+        :return: the parsed email, or `None` if it does not have the fixed layout and needs the full parser.
+        """
+        crlf = data.find(b'\r\n\r\n')
+        lf = data.find(b'\n\n')
+        if crlf != -1 and (lf == -1 or crlf < lf):
+            head, body = data[:crlf], data[crlf+4:]
+        elif lf != -1:
+            head, body = data[:lf], data[lf+2:]
+        else:
+            return None
+        try:
+            head = head.decode('ascii')
+        except UnicodeDecodeError:
+            return None
+        headers = {}
+        for line in head.splitlines():
+            if line[:1] in (' ', '\t') or line.startswith('From '):  # folded header or mbox separator
+                return None
+            name, sep, value = line.partition(':')
+            if not sep:
+                return None
+            headers.setdefault(name.strip().lower(), value.lstrip(' \t'))
+        content_type = headers.get('content-type', '').strip().lower()
+        if '/' not in content_type or ';' in content_type or content_type.startswith('multipart/'):
+            return None
+        encoding = headers.get('content-transfer-encoding', '').strip().lower()
+        headers['content-type'] = content_type
+        if payload is not None:
+            return cls(headers, payload)
+        if encoding == 'binary':
+            return cls(headers, body)
+        if encoding != 'base64':
+            return None
+        try:
+            payload = binascii.a2b_base64(body)
+        except binascii.Error:
+            return None
+        return cls(headers, payload)
+
+    @classmethod
+    def build(
+            cls,
+            content_type: str,
+            mailer: str,
+            from_: Endpoint,
+            to: Endpoint,
+            payload: bytes,
+            binary: bool = False) -> Optional[bytes]:
+        """
+        Encode an email the same way as `MIMEApplication(...).as_bytes()` with the headers added by packets.
+
+        With `binary`, the payload is instead included as-is with the binary transfer encoding and headers end with
+        CRLF, which is the form sent by BDAT (RFC 3030).
+
+        :param content_type: the full content type, e.g. `application/x-mailim-packet`.
+        :param mailer: the value of the X-Mailer header.
+        :param from_: the sender endpoint.
+        :param to: the recipient endpoint.
+        :param payload: the body before base64 encoding.
+        :param binary: whether to use the binary transfer encoding.
+        :return: the raw email, or `None` if any header needs folding or encoding and the `email` package must be used.
+        """
+        lines = [
+            'Content-Type: ' + content_type,
+            'MIME-Version: 1.0',
+            'Content-Transfer-Encoding: ' + ('binary' if binary else 'base64'),
+            'X-Mailer: ' + mailer,
+            'From: ' + formataddr((from_.port, from_.address)),
+            'To: ' + formataddr((to.port, to.address)),
+        ]
+        for line in lines:
+            if len(line) > cls.__MAX_LINE_LENGTH or not line.isascii() or '\r' in line or '\n' in line:
+                return None
+        if binary:
+            return ('\r\n'.join(lines) + '\r\n\r\n').encode('ascii') + payload
+        return ('\n'.join(lines) + '\n\n').encode('ascii') + cls.__encode_base64(payload)
+
+    @staticmethod
+    def as_bytes(msg: email.message.Message, binary: bool = False) -> bytes:
+        """
+        Encode an email built by the `email` package, for when `build` is not applicable.
+
+        :param msg: the email, whose body is base64 encoded.
+        :param binary: whether the email is to be sent by BDAT, which needs CRLF line endings. The body stays base64
+        encoded since the `email` package would rewrite line endings in a binary one.
+        :return: the raw email.
+        """
+        if binary:
+            return msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+        return msg.as_bytes()
+
+    @staticmethod
+    def __encode_base64(payload: bytes) -> bytes:
+        # same line length as `base64.encodebytes`, which `email.encoders.encode_base64` uses
+        return b''.join(binascii.b2a_base64(payload[i:i+57]) for i in range(0, len(payload), 57))
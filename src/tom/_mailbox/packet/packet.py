@@ -1,8 +1,66 @@
+from typing import Callable, ClassVar, Dict, Optional, Tuple, Type
 from dataclasses import dataclass
+import email.message
+from email.utils import formataddr
+from email.mime.application import MIMEApplication
 from ... import Endpoint
+from .fast_message import FastMessage
+import src.config
 
 
 @dataclass()
 class Packet:
     from_ : Endpoint
     to: Endpoint
+
+    __formats: ClassVar[Dict[str, Type['Packet']]] = {}  # content type -> packet class
+
+    @staticmethod
+    def register(*content_types: str) -> Callable[[Type['Packet']], Type['Packet']]:
+        """
+        Class decorator to register a packet format, whose `from_message` decodes emails of the given content types.
+
+        A format that changes incompatibly should register a new content type rather than reuse an existing one.
+
+        :param content_types: the content types of emails carrying packets of this format.
+        """
+        def decorator(cls: Type[Packet]) -> Type[Packet]:
+            for content_type in content_types:
+                assert content_type not in Packet.__formats, 'content type already registered'
+                Packet.__formats[content_type] = cls
+            return cls
+        return decorator
+
+    @staticmethod
+    def decoder_for(msg: email.message.Message) -> Optional[Type['Packet']]:
+        """
+        :param msg: a received email.
+        :return: the registered packet class that decodes the email, or `None` if it does not carry a packet.
+        """
+        return Packet.__formats.get(msg.get_content_type())
+
+    def _content(self) -> Tuple[str, bytes]:
+        """
+        :return: the content type and the body before transfer encoding of the email carrying this packet, which each
+        packet class provides.
+        """
+        raise NotImplementedError()
+
+    def to_message(self) -> email.message.Message:
+        return self.__message(*self._content())
+
+    def to_bytes(self, binary: bool = False) -> bytes:
+        """
+        :param binary: whether to encode for BDAT, see `FastMessage.build` and `FastMessage.as_bytes`.
+        :return: the same as `self.to_message().as_bytes()`, skipping the `email` package where possible.
+        """
+        content_type, data = self._content()
+        raw = FastMessage.build(content_type, src.config.config['tom']['X-Mailer'], self.from_, self.to, data, binary)
+        return raw if raw is not None else FastMessage.as_bytes(self.__message(content_type, data), binary)
+
+    def __message(self, content_type: str, data: bytes) -> email.message.Message:
+        msg = MIMEApplication(data, content_type.split('/')[1], email.encoders.encode_base64)
+        msg.add_header('X-Mailer', src.config.config['tom']['X-Mailer'])
+        msg.add_header('From', formataddr((self.from_.port, self.from_.address)))
+        msg.add_header('To', formataddr((self.to.port, self.to.address)))
+        return msg
@@ -0,0 +1,95 @@
+from __future__ import annotations
+from typing import List, Tuple, Union
+from dataclasses import dataclass
+import email.message
+from email.utils import parseaddr
+from ... import Endpoint
+from . import packet_pb2, Packet, PlainPacket, SecurePacket, EncodedPacket
+import src.config
+
+
+@Packet.register('application/x-mailim-packet-bundle', 'application/x-mailim-packet-secure-bundle')
+@dataclass()
+class PacketBundle(Packet):
+    """
+    Multiple packets of the same connection carried by a single email.
+    """
+
+    packets: List[Union[PlainPacket, SecurePacket, EncodedPacket]]
+
+    @property
+    def secure(self) -> bool:
+        packet = self.packets[0]
+        return packet.secure if isinstance(packet, EncodedPacket) else isinstance(packet, SecurePacket)
+
+    @classmethod
+    def pack(cls, packets: List[Packet], max_size: int) -> List[Packet]:
+        """
+        Group packets of the same connection into as few emails as possible.
+
+        :param packets: a list of either plain or secure packets, in the order to send. `EncodedPacket`s may be mixed
+        with the packets of the same kind.
+        :param max_size: the maximum total size of payloads in a single email. A packet larger than this will be sent
+        on its own.
+        :return: a list of packets to send as separate emails, where each item is either a packet from the input or a
+        `PacketBundle` containing more than one of them.
+        """
+        groups = []
+        group_size = 0
+        for packet in packets:
+            size = cls.payload_size(packet)
+            if not groups or group_size + size > max_size:
+                groups.append([])
+                group_size = 0
+            groups[-1].append(packet)
+            group_size += size
+        return [group[0] if len(group) == 1 else cls(group[0].from_, group[0].to, group) for group in groups]
+
+    @staticmethod
+    def payload_size(packet: Packet) -> int:
+        """
+        :param packet: a `PlainPacket`, `SecurePacket` or `EncodedPacket`.
+        :return: the size of its payload in bytes, which is the ciphertext for secure packets.
+        """
+        if isinstance(packet, EncodedPacket):
+            return packet.payload_size
+        return len(packet.body) if isinstance(packet, SecurePacket) else len(packet.payload)
+
+    @classmethod
+    def from_message(cls, msg: email.message.Message) -> PacketBundle:
+        if msg.get('X-Mailer') != src.config.config['tom']['X-Mailer']:
+            raise Exception('invalid packet: invalid X-Mailer header')
+        content_type = msg.get_content_type()
+        if content_type == 'application/x-mailim-packet-bundle':
+            packet_cls, bundle = PlainPacket, packet_pb2.PlainPacketBundle()
+        elif content_type == 'application/x-mailim-packet-secure-bundle':
+            packet_cls, bundle = SecurePacket, packet_pb2.SecurePacketBundle()
+        else:
+            raise Exception('invalid packet: invalid Content-Type header')
+        bundle.ParseFromString(msg.get_payload(decode=True))
+        if not bundle.packets:
+            raise Exception('invalid packet: empty bundle')
+        from_ = Endpoint(*reversed(parseaddr(msg.get('From'))))
+        to = Endpoint(*reversed(parseaddr(msg.get('To'))))
+        return cls(from_, to, [packet_cls.from_pb((from_, to), packet) for packet in bundle.packets])
+
+    def _content(self) -> Tuple[str, bytes]:
+        if self.secure:
+            content_type = 'application/x-mailim-packet-secure-bundle'
+        else:
+            content_type = 'application/x-mailim-packet-bundle'
+        # both bundle messages only have `repeated ... packets = 1`, so the encoding is the concatenation of the items
+        data = b''.join(
+            self.__encode_item(packet.data if isinstance(packet, EncodedPacket) else packet.to_pb().SerializeToString())
+            for packet in self.packets)
+        return content_type, data
+
+    @staticmethod
+    def __encode_item(data: bytes) -> bytes:
+        header = bytearray(b'\x0a')     # field 1, length-delimited
+        size = len(data)
+        while size >= 0x80:
+            header.append(size & 0x7f | 0x80)
+            size >>= 7
+        header.append(size)
+        return bytes(header) + data
@@ -1,19 +1,20 @@
 from __future__ import annotations
-from typing import Set, Tuple
+from typing import AbstractSet, Tuple
 from dataclasses import dataclass
 import email.message
-from email.utils import parseaddr, formataddr
-from email.mime.application import MIMEApplication
+from email.utils import parseaddr
 from ... import Endpoint
 from . import packet_pb2, Packet
+from .ack_set import AckSet
 import src.config
 
 
+@Packet.register('application/x-mailim-packet')
 @dataclass()
 class PlainPacket(Packet):
     seq: int
     attempt: int
-    acks: Set[Tuple[int, int]]           # {(seq, attempt)}
+    acks: AbstractSet[Tuple[int, int]]   # {(seq, attempt)}
     payload: bytes
     is_syn: bool = False
 
@@ -32,30 +33,19 @@ class PlainPacket(Packet):
     @classmethod
     def from_pb(cls, endpoints: Tuple[Endpoint, Endpoint],  packet: packet_pb2.PlainPacket) -> PlainPacket:
         is_syn = packet.header.is_syn
-        acks = set((id.seq, id.attempt) for id in packet.header.acks)
+        acks = AckSet.from_pb(packet.header.acks, packet.header.ack_ranges)
         seq = packet.body.id.seq
         attempt = packet.body.id.attempt
         payload = packet.body.payload
         return cls(endpoints[0], endpoints[1], seq, attempt, acks, payload, is_syn)
 
-    def to_message(self) -> email.message.Message:
-        packet = self.to_pb()
-        msg = MIMEApplication(packet.SerializeToString(), 'x-mailim-packet', email.encoders.encode_base64)
-        msg.add_header('X-Mailer', src.config.config['tom']['X-Mailer'])
-        msg.add_header('From', formataddr((self.from_.port, self.from_.address)))
-        msg.add_header('To', formataddr((self.to.port, self.to.address)))
-        return msg
+    def _content(self) -> Tuple[str, bytes]:
+        return 'application/x-mailim-packet', self.to_pb().SerializeToString()
 
     def to_pb(self) -> packet_pb2.PlainPacket:
         packet = packet_pb2.PlainPacket()
         packet.header.is_syn = self.is_syn
-        acks = []
-        for seq, attempt in self.acks:
-            id = packet_pb2.PacketId()
-            id.seq = seq
-            id.attempt = attempt
-            acks.append(id)
-        packet.header.acks.extend(acks)
+        AckSet(self.acks).write_pb(packet.header, src.config.config['tom']['LegacyAcks'])
         packet.body.id.seq = self.seq
         packet.body.id.attempt = self.attempt
         packet.body.payload = self.payload
@@ -1,25 +1,28 @@
 from __future__ import annotations
-from typing import Tuple, Set
-from dataclasses import dataclass
+from typing import AbstractSet, List, Optional, Tuple
+from dataclasses import dataclass, field
 import email.message
-from email.utils import parseaddr, formataddr
-from email.mime.application import MIMEApplication
+from email.utils import parseaddr
 import Crypto.Random
 from xeddsa.xeddsa import XEdDSA
 from ... import Endpoint
 from . import packet_pb2, Packet, PlainPacket
+from .ack_set import AckSet
 import doubleratchet.header
 from src.crypto.doubleratchet import DoubleRatchet
 import src.config
 
 
+@Packet.register('application/x-mailim-packet-secure')
 @dataclass()
 class SecurePacket(Packet):
-    acks: Set[Tuple[int, int]]  # {(seq, attempt)}
+    acks: AbstractSet[Tuple[int, int]]  # {(seq, attempt)}
     dr_header: doubleratchet.header.Header
     signature: bytes
     body: bytes
     is_syn: bool = False
+    # acks in the legacy format as received, whose order is up to the sender and covered by the signature
+    legacy_acks_order: Optional[List[Tuple[int, int]]] = field(default=None, repr=False)
 
     def __eq__(self, other: SecurePacket):
         return (super().__eq__(other)
@@ -46,33 +49,32 @@ class SecurePacket(Packet):
     @classmethod
     def from_pb(cls, endpoints: Tuple[Endpoint, Endpoint], packet: packet_pb2.SecurePacket) -> SecurePacket:
         is_syn = packet.header.is_syn
-        acks = set((id.seq, id.attempt) for id in packet.header.acks)
+        acks = AckSet.from_pb(packet.header.acks, packet.header.ack_ranges)
         dh_pub = packet.header.dh_pub
         n = packet.header.n
         pn = packet.header.pn if packet.header.pn != -1 else None
         dr_header = doubleratchet.header.Header(dh_pub, n, pn)
         signature = packet.header.signature
         body = packet.body
-        return cls(endpoints[0], endpoints[1], acks, dr_header, signature, body, is_syn)
-
-    def to_message(self) -> email.message.Message:
-        packet = self.to_pb()
-        msg = MIMEApplication(packet.SerializeToString(), 'x-mailim-packet-secure', email.encoders.encode_base64)
-        msg.add_header('X-Mailer', src.config.config['tom']['X-Mailer'])
-        msg.add_header('From', formataddr((self.from_.port, self.from_.address)))
-        msg.add_header('To', formataddr((self.to.port, self.to.address)))
-        return msg
-
-    def __to_pb_header(self):
+        legacy_acks_order = [(id.seq, id.attempt) for id in packet.header.acks] or None
+        return cls(endpoints[0], endpoints[1], acks, dr_header, signature, body, is_syn, legacy_acks_order)
+
+    def _content(self) -> Tuple[str, bytes]:
+        return 'application/x-mailim-packet-secure', self.to_pb().SerializeToString()
+
+    def __to_pb_header(self, legacy_acks: Optional[bool] = None):
+        """
+        :param legacy_acks: whether to encode acks in the legacy format, which defaults to `LegacyAcks`.
+        """
+        if legacy_acks is None:
+            legacy_acks = src.config.config['tom']['LegacyAcks']
         header = packet_pb2.SecurePacketHeader()
         header.is_syn = self.is_syn
-        acks = []
-        for seq, attempt in self.acks:
-            id = packet_pb2.PacketId()
-            id.seq = seq
-            id.attempt = attempt
-            acks.append(id)
-        header.acks.extend(acks)
+        if legacy_acks and self.legacy_acks_order is not None:
+            for seq, attempt in self.legacy_acks_order:
+                header.acks.add(seq=seq, attempt=attempt)
+        else:
+            AckSet(self.acks).write_pb(header, legacy_acks)
         header.dh_pub = self.dr_header.dh_pub
         header.n = self.dr_header.n
         header.pn = self.dr_header.pn if self.dr_header.pn is not None else -1
@@ -98,7 +100,7 @@ class SecurePacket(Packet):
     def encrypt(cls, plain_packet: PlainPacket, ratchet: DoubleRatchet, xeddsa: XEdDSA) -> SecurePacket:
         if plain_packet.seq == -1:  # pure ack
             header = doubleratchet.header.Header(b'', 0, 0)
-            return cls(plain_packet.from_, plain_packet.to, set(plain_packet.acks), header, b'', b'', plain_packet.is_syn)
+            return cls(plain_packet.from_, plain_packet.to, AckSet(plain_packet.acks), header, b'', b'', plain_packet.is_syn)
         if plain_packet.seq == 0 and plain_packet.is_syn:  # handshake
             body = None
             cipher = {
@@ -111,7 +113,7 @@ class SecurePacket(Packet):
         self = cls(
             plain_packet.from_,
             plain_packet.to,
-            set(plain_packet.acks),
+            AckSet(plain_packet.acks),
             cipher['header'],
             b'',
             cipher['ciphertext'],
@@ -128,7 +130,7 @@ class SecurePacket(Packet):
 
     def decrypt(self, ratchet: DoubleRatchet, xeddsa: XEdDSA) -> PlainPacket:
         if self.body == b'' and self.dr_header.dh_pub == b'':  # pure ack
-            return PlainPacket(self.from_, self.to, -1, 0, set(self.acks), b'', self.is_syn)
+            return PlainPacket(self.from_, self.to, -1, 0, AckSet(self.acks), b'', self.is_syn)
         if self.body == b'' and self.is_syn:  # handshake
             body = None
         else:
@@ -136,14 +138,20 @@ class SecurePacket(Packet):
             body = packet_pb2.SecurePacketBody()
             body.ParseFromString(cleartext)
 
-        header = self.__to_pb_header()
-        header.signature = b''
-
-        signed_part = packet_pb2.SecurePacketSignedPart()
-        signed_part.header.CopyFrom(header)
-        if body is not None:
-            signed_part.body.CopyFrom(body)
-        if not xeddsa.verify(signed_part.SerializeToString(), self.signature):
+        # the signed header is rebuilt with legacy acks in the received order, and peers may encode acks either way
+        # while moving to ack ranges
+        preferred = src.config.config['tom']['LegacyAcks']
+        for legacy_acks in (preferred, not preferred):
+            header = self.__to_pb_header(legacy_acks)
+            header.signature = b''
+
+            signed_part = packet_pb2.SecurePacketSignedPart()
+            signed_part.header.CopyFrom(header)
+            if body is not None:
+                signed_part.body.CopyFrom(body)
+            if xeddsa.verify(signed_part.SerializeToString(), self.signature):
+                break
+        else:
             raise Exception('invalid signature')
 
         if body is None:
@@ -152,5 +160,5 @@ class SecurePacket(Packet):
         else:
             seq = body.id.seq
             payload = body.payload
-        return PlainPacket(self.from_, self.to, seq, 0, set(self.acks), payload, self.is_syn)
+        return PlainPacket(self.from_, self.to, seq, 0, AckSet(self.acks), payload, self.is_syn)
 
@@ -0,0 +1,25 @@
+from typing import Callable, Hashable, Optional
+
+
+class ScheduledTask:
+    """
+    A handle of a task scheduled with `MailboxTasks._schedule_task`, which can be used to cancel the task.
+    """
+
+    deadline: float
+    task: Optional[Callable]        # None once cancelled or dispatched
+    key: Optional[Hashable]
+    cancelled: bool
+
+    def __init__(self, deadline: float, task: Callable, key: Optional[Hashable]):
+        self.deadline = deadline
+        self.task = task
+        self.key = key
+        self.cancelled = False
+
+    @property
+    def pending(self) -> bool:
+        """
+        :return: whether the task has neither been cancelled nor dispatched for execution.
+        """
+        return self.task is not None
@@ -0,0 +1,74 @@
+from typing import Callable, Deque, Dict, Hashable, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+
+class SerialExecutor:
+    """
+    A bounded thread pool that runs tasks sharing the same key in submission order and never concurrently.
+
+    Tasks with different keys, as well as tasks without a key, may run in parallel.
+    """
+
+    __executor: ThreadPoolExecutor
+    __queues: Dict[Hashable, Deque[Callable]]   # key -> tasks waiting behind the running one
+    __mutex: threading.Lock
+
+    def __init__(self, max_workers: int):
+        """
+        :param max_workers: the maximum number of worker threads.
+        """
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.__queues = {}
+        self.__mutex = threading.Lock()
+
+    def submit(self, task: Callable, key: Optional[Hashable] = None):
+        """
+        Submit a task for execution.
+
+        :param task: the function to execute.
+        :param key: tasks with the same key are serialized. Omit to run without ordering constraints.
+        """
+        if key is None:
+            self.__executor.submit(self.__run, task)
+            return
+        with self.__mutex:
+            queue = self.__queues.get(key)
+            if queue is not None:
+                queue.append(task)
+                return
+            self.__queues[key] = deque()
+        self.__executor.submit(self.__run_serial, key, task)
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop accepting new tasks.
+
+        :param wait: whether to wait for running and queued tasks to finish.
+        """
+        self.__executor.shutdown(wait=wait)
+
+    def __run_serial(self, key: Hashable, task: Callable):
+        while True:
+            self.__run(task)
+            with self.__mutex:
+                queue = self.__queues[key]
+                if not queue:
+                    del self.__queues[key]
+                    return
+                task = queue.popleft()
+            # go to the back of the pool queue so a busy key does not starve others
+            try:
+                self.__executor.submit(self.__run_serial, key, task)
+                return
+            except RuntimeError:  # shutting down, drain the remaining tasks here
+                pass
+
+    @staticmethod
+    def __run(task: Callable):
+        try:
+            task()
+        except Exception:
+            # TODO: exception handling for scheduled tasks
+            pass
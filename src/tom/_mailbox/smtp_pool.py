@@ -0,0 +1,205 @@
+from typing import List, Tuple
+import contextlib
+import time
+import threading
+import smtplib
+from ..credential import Credential
+
+
+class SMTPPool:
+    """
+    A bounded pool of authenticated SMTP sessions.
+
+    Sessions are created lazily up to `max_size`, checked out for exclusive use and returned afterwards. A session that
+    has been idle for longer than `health_check` seconds is probed with NOOP before being handed out, and sessions that
+    have been idle for longer than `idle_timeout` seconds are closed on the next `checkout` or `reap`.
+    """
+
+    __credential: Credential
+    __max_size: int
+    __idle_timeout: float
+    __health_check: float
+    __idle: List[Tuple[smtplib.SMTP, float]]    # [(session, last used)], most recently used last
+    __size: int
+    __cv: threading.Condition
+    __closed: bool = False
+
+    def __init__(self, credential: Credential, max_size: int, idle_timeout: float, health_check: float):
+        """
+        Initialize the pool and open the first session.
+
+        :param credential: SMTP credential.
+        :param max_size: the maximum number of concurrent sessions.
+        :param idle_timeout: idle sessions will be closed after this number of seconds.
+        :param health_check: sessions idle for longer than this number of seconds will be checked before use.
+        """
+        if max_size < 1:
+            raise Exception('invalid SMTP pool size')
+        self.__credential = credential
+        self.__max_size = max_size
+        self.__idle_timeout = idle_timeout
+        self.__health_check = health_check
+        self.__cv = threading.Condition()
+        # fail fast on invalid credentials
+        self.__idle = [(self.__connect(), time.time())]
+        self.__size = 1
+
+    def __connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.__credential.host, self.__credential.port)
+        smtp.ehlo()
+        smtp.starttls()
+        smtp.login(self.__credential.username, self.__credential.password)
+        return smtp
+
+    @staticmethod
+    def __disconnect(smtp: smtplib.SMTP):
+        with contextlib.suppress(Exception):
+            smtp.close()
+
+    @staticmethod
+    def __is_alive(smtp: smtplib.SMTP) -> bool:
+        try:
+            return smtp.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+
+    @staticmethod
+    def binary(smtp: smtplib.SMTP) -> bool:
+        """
+        :param smtp: an authenticated SMTP session.
+        :return: whether the server accepts binary bodies, which needs both BINARYMIME and CHUNKING (RFC 3030).
+        8BITMIME alone does not allow arbitrary bytes, so it is of no use for packets.
+        """
+        return bool(smtp.has_extn('binarymime') and smtp.has_extn('chunking'))
+
+    @staticmethod
+    def send(smtp: smtplib.SMTP, from_addr: str, to_addr: str, msg: bytes, binary: bool = False):
+        """
+        Send an email.
+
+        :param smtp: an authenticated SMTP session.
+        :param from_addr: the envelope sender.
+        :param to_addr: the envelope recipient.
+        :param msg: the raw email.
+        :param binary: whether to send the email as-is with a single BDAT command, which requires `binary(smtp)`.
+        Otherwise it is sent with DATA, which needs a 7-bit body. The session should be discarded if this raises.
+        """
+        if not binary:
+            smtp.sendmail(from_addr, to_addr, msg)
+            return
+        code, resp = smtp.mail(from_addr, ['BODY=BINARYMIME'])
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+        code, resp = smtp.rcpt(to_addr)
+        if code not in (250, 251):
+            raise smtplib.SMTPRecipientsRefused({to_addr: (code, resp)})
+        smtp.send(b'BDAT %d LAST\r\n' % len(msg) + msg)
+        code, resp = smtp.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, resp)
+
+    def __reap(self, now: float) -> List[smtplib.SMTP]:
+        """
+        Remove expired idle sessions from the pool. Must be called with `__cv` held.
+
+        :param now: current time.
+        :return: removed sessions, which are to be closed after releasing `__cv`.
+        """
+        expired = [smtp for smtp, last_used in self.__idle if now - last_used > self.__idle_timeout]
+        if expired:
+            self.__idle = [(smtp, last_used) for smtp, last_used in self.__idle if now - last_used <= self.__idle_timeout]
+            self.__size -= len(expired)
+            self.__cv.notify(len(expired))
+        return expired
+
+    def reap(self):
+        """
+        Close sessions that have been idle for longer than `idle_timeout`, which is otherwise only done on checkout.
+        """
+        with self.__cv:
+            expired = self.__reap(time.time())
+        for smtp in expired:
+            self.__disconnect(smtp)
+
+    def checkout(self) -> smtplib.SMTP:
+        """
+        Take a session out of the pool, blocking if all sessions are in use.
+
+        The session must be given back with `checkin`.
+
+        :return: an authenticated SMTP session.
+        """
+        while True:
+            with self.__cv:
+                while not self.__closed and not self.__idle and self.__size >= self.__max_size:
+                    self.__cv.wait()
+                if self.__closed:
+                    raise Exception('SMTP pool already closed')
+                now = time.time()
+                expired = self.__reap(now)
+                if self.__idle:
+                    smtp, last_used = self.__idle.pop()
+                    smtp_new = False
+                else:
+                    smtp, last_used = None, now
+                    smtp_new = True
+                    self.__size += 1
+            for smtp_expired in expired:
+                self.__disconnect(smtp_expired)
+            if smtp_new:
+                try:
+                    return self.__connect()
+                except Exception:
+                    self.__discard()
+                    raise
+            if now - last_used <= self.__health_check or self.__is_alive(smtp):
+                return smtp
+            self.__disconnect(smtp)
+            self.__discard()
+
+    def checkin(self, smtp: smtplib.SMTP, broken: bool = False):
+        """
+        Give a session back to the pool.
+
+        :param smtp: a session previously returned by `checkout`.
+        :param broken: whether the session is in an unknown state and should be closed instead of reused.
+        """
+        with self.__cv:
+            if not broken and not self.__closed:
+                self.__idle.append((smtp, time.time()))
+                self.__cv.notify()
+                return
+        self.__disconnect(smtp)
+        self.__discard()
+
+    def __discard(self):
+        with self.__cv:
+            self.__size -= 1
+            self.__cv.notify()
+
+    @contextlib.contextmanager
+    def session(self):
+        """
+        Check out a session for the duration of a `with` block.
+
+        The session will be discarded if the block raises an exception.
+        """
+        smtp = self.checkout()
+        try:
+            yield smtp
+        except BaseException:
+            self.checkin(smtp, broken=True)
+            raise
+        self.checkin(smtp)
+
+    def close(self):
+        """
+        Close all idle sessions. Sessions currently in use will be closed when given back.
+        """
+        with self.__cv:
+            self.__closed = True
+            idle, self.__idle = self.__idle, []
+            self.__size -= len(idle)
+            self.__cv.notify_all()
+        for smtp, _ in idle:
+            self.__disconnect(smtp)
@@ -1,9 +1,11 @@
 from typing import Dict, Tuple, Set, DefaultDict, Deque, List, Optional
 from collections import defaultdict, deque
 import threading
+from concurrent.futures import Future
 from xeddsa.implementations.xeddsa25519 import XEdDSA, XEdDSA25519
 from src.crypto.doubleratchet import DoubleRatchet
-from .packet import Packet, SecurePacket
+from .packet import SecurePacket, EncodedPacket, AckSet
+from .scheduled_task import ScheduledTask
 from .. import Endpoint
 
 
@@ -43,13 +45,26 @@ class Connected(Waitable, Epollable):
     remote_endpoint: Endpoint
     next_seq: int
     recv_cursor: Tuple[int, int]                                # (seq, offset)
-    pending_local: Dict[int, Packet]                            # seq -> payload
+    pending_local: Dict[int, EncodedPacket]                     # seq -> packet awaiting ack
     pending_remote: Dict[int, bytes]                            # seq -> payload
-    sent_acks: Dict[Tuple[int, int], Set[Tuple[int, int]]]      # (seq, attempt) -> {(seq, attempt)}
+    sent_acks: Dict[Tuple[int, int], AckSet]                    # (seq, attempt) -> {(seq, attempt)}
     attempts: DefaultDict[int, int]                             # seq -> next attempt
-    to_ack: Set[Tuple[int, int]]                                # {(seq, attempt)}
+    to_ack: AckSet                                              # {(seq, attempt)}
     syn_seq: int
     ack_scheduled: bool
+    ack_task: Optional[ScheduledTask]
+    rto_task: Optional[ScheduledTask]
+    first_sent: Dict[int, Tuple[float, int]]                    # seq -> (time, attempt) of first transmission since restored
+    sent_times: Dict[Tuple[int, int], float]                    # (seq, attempt) -> time of transmission
+    unsent: List[int]                                           # [seq] queued for first transmission
+    transmitting: bool
+    send_buffer: bytes                                          # small writes waiting to be coalesced into one segment
+    flush_task: Optional[ScheduledTask]
+    nodelay: bool
+    futures: Dict[int, List[Future]]                            # seq -> futures resolved when acked
+    buffered_futures: List[Future]                              # futures of data in send_buffer
+    srtt: Optional[float]                                       # smoothed round-trip time in seconds
+    rttvar: Optional[float]                                     # round-trip time variation in seconds
     pending_packets: List[SecurePacket]
     __STATE_KEYS: List[str] = [
         'local_endpoint',
@@ -63,6 +78,9 @@ class Connected(Waitable, Epollable):
         'to_ack',
         'syn_seq',
         'ack_scheduled',
+        'nodelay',
+        'srtt',
+        'rttvar',
     ]
 
     def __init__(self, local_endpoint: Endpoint, remote_endpoint: Endpoint):
@@ -75,9 +93,22 @@ class Connected(Waitable, Epollable):
         self.pending_remote = {}
         self.sent_acks = {}
         self.attempts = defaultdict(int)
-        self.to_ack = set()
+        self.to_ack = AckSet()
         self.syn_seq = None
         self.ack_scheduled = False
+        self.ack_task = None
+        self.rto_task = None
+        self.first_sent = {}
+        self.sent_times = {}
+        self.unsent = []
+        self.transmitting = False
+        self.send_buffer = b''
+        self.flush_task = None
+        self.futures = {}
+        self.buffered_futures = []
+        self.nodelay = False
+        self.srtt = None
+        self.rttvar = None
         self.pending_packets = []
 
     def __getstate__(self):
@@ -88,15 +119,36 @@ class Connected(Waitable, Epollable):
 
     def __setstate__(self, state):
         super().__init__()
+        self.nodelay = False
+        self.srtt = None
+        self.rttvar = None
         self.__dict__.update({
             k: v
             for k, v in state.items() if k in self.__class__.__STATE_KEYS
         })
+        # dumps taken before acks were stored as ranges
+        self.to_ack = AckSet(self.to_ack)
+        self.sent_acks = {id: AckSet(acks) for id, acks in self.sent_acks.items()}
+        # dumps taken before pending packets were kept serialized
+        self.pending_local = {
+            seq: packet if isinstance(packet, EncodedPacket) else EncodedPacket.encode(packet)
+            for seq, packet in self.pending_local.items()
+        }
         if self.pending_local:
             self.syn_seq = min(self.pending_local.keys())
         else:
             self.syn_seq = self.next_seq
         self.ack_scheduled = False
+        self.ack_task = None
+        self.rto_task = None
+        self.first_sent = {}
+        self.sent_times = {}
+        self.unsent = []
+        self.transmitting = False
+        self.send_buffer = b''
+        self.flush_task = None
+        self.futures = {}
+        self.buffered_futures = []
         self.pending_packets = []
 
 
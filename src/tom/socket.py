@@ -1,6 +1,7 @@
 from __future__ import annotations
 import time
 from typing import Optional, Callable, Union, Tuple
+from concurrent.futures import Future
 from . import Mailbox, Endpoint
 
 
@@ -101,6 +102,27 @@ class Socket:
         """
         return self.__mailbox.socket_send(self.__id, buf)
 
+    def send_tracked(self, buf: bytes) -> Future:
+        """
+        Send data to the socket and track its delivery. The socket must be connected to a remote socket.
+
+        :param buf: data to send.
+        :return: a future that resolves once the remote has acknowledged the data, or fails if the socket is closed
+        before that.
+        """
+        return self.__mailbox.socket_send_tracked(self.__id, buf)
+
+    def set_nodelay(self, nodelay: bool):
+        """
+        Enable or disable coalescing of small writes for the connected socket.
+
+        Coalescing is only performed if `CoalesceDelay` is configured. Enabling no delay also sends any buffered data
+        immediately.
+
+        :param nodelay: `True` to send every write as soon as possible, or `False` to allow coalescing.
+        """
+        self.__mailbox.socket_set_nodelay(self.__id, nodelay)
+
     def recv(self, max_size: int, timeout: Optional[float] = None) -> bytes:
         """
         Receive data from the socket. The socket must be connected.
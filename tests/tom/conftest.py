@@ -0,0 +1,28 @@
+from typing import Callable, Tuple
+import pytest
+from faker import Faker
+from src.tom import Endpoint
+from src.tom._mailbox.packet import PlainPacket, SecurePacket
+import doubleratchet.header
+
+
+@pytest.fixture()
+def endpoints(faker: Faker) -> Tuple[Endpoint, Endpoint]:
+    return Endpoint(faker.email(), faker.uuid4()), Endpoint(faker.email(), faker.uuid4())
+
+
+@pytest.fixture()
+def make_plain(faker: Faker, endpoints) -> Callable[..., PlainPacket]:
+    def make(seq: int, size: int = 111) -> PlainPacket:
+        acks = set((faker.pyint(), faker.pyint()) for i in range(10))
+        return PlainPacket(*endpoints, seq, faker.pyint(), acks, faker.binary(size))
+    return make
+
+
+@pytest.fixture()
+def make_secure(faker: Faker, endpoints) -> Callable[..., SecurePacket]:
+    def make(size: int = 111) -> SecurePacket:
+        acks = set((faker.pyint(), faker.pyint()) for i in range(10))
+        dr_header = doubleratchet.header.Header(faker.binary(32), faker.pyint(), faker.pyint())
+        return SecurePacket(*endpoints, acks, dr_header, faker.binary(64), faker.binary(size))
+    return make
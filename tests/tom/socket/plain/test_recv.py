@@ -4,8 +4,9 @@ from faker import Faker
 from unittest.mock import call
 import imapclient
 import time
+import threading
 from src.tom import Endpoint
-from src.tom._mailbox.packet import PlainPacket as Packet
+from src.tom._mailbox.packet import PlainPacket as Packet, PacketBundle
 
 
 @pytest.mark.timeout(5)
@@ -23,6 +24,7 @@ def test_simple(faker: Faker, helper: SocketTestHelper):
     socket.close()
 
     assert ret == payload
+    helper.wait_listener_idle()
     helper.mock_store.add_flags.assert_called_once_with([uid], [imapclient.SEEN])
     thread.join()
 
@@ -105,6 +107,7 @@ def test_not_block(faker: Faker, helper: SocketTestHelper):
     socket.close()
 
     assert ret == payload
+    helper.wait_listener_idle()
     helper.mock_store.add_flags.assert_called_once_with([uid], [imapclient.SEEN])
 
 
@@ -124,6 +127,7 @@ def test_multiple_packets(faker: Faker, helper: SocketTestHelper):
     socket.close()
 
     assert ret == b''.join(payloads)[:195]
+    helper.wait_listener_idle()
     helper.mock_store.add_flags.assert_called_once_with([uid + i for i in range(3)], [imapclient.SEEN])
 
 
@@ -143,6 +147,7 @@ def test_exact(faker: Faker, helper: SocketTestHelper):
     socket.close()
 
     assert ret == b''.join(payloads)
+    helper.wait_listener_idle()
     helper.mock_store.add_flags.assert_has_calls([
         call([uid + i], [imapclient.SEEN]) for i in range(2)
     ])
@@ -165,6 +170,7 @@ def test_exact_multiple_packets(faker: Faker, helper: SocketTestHelper):
     socket.close()
 
     assert ret == b''.join(payloads)[:195]
+    helper.wait_listener_idle()
     helper.mock_store.add_flags.assert_called_once_with([uid + i for i in range(3)], [imapclient.SEEN])
 
 
@@ -190,6 +196,7 @@ def test_multiple_sockets(faker: Faker, helper: SocketTestHelper):
 
     assert ret1 == payloads[0] + payloads[4]
     assert ret2 == payloads[1] + payloads[2] + payloads[3]
+    helper.wait_listener_idle()
     helper.mock_store.add_flags.assert_called_once_with([uid + i for i in range(5)], [imapclient.SEEN])
 
 
@@ -242,6 +249,7 @@ def test_order(faker: Faker, helper: SocketTestHelper):
     socket.close()
 
     assert ret == payloads[1] + payloads[2] + payloads[0]
+    helper.wait_listener_idle()
     helper.mock_store.add_flags.assert_called_once_with([uid + i for i in range(3)], [imapclient.SEEN])
 
 
@@ -362,3 +370,54 @@ def test_ack_scheduled_flag_reset(faker: Faker, helper: SocketTestHelper):
     time.sleep(start + 5 - time.time())
     # +5s
     helper.assert_sent(Packet(*endpoints, -1, 0, {(1, 0)}, b''), 0.5)
+
+
+@pytest.mark.timeout(5)
+def test_bundle(faker: Faker, helper: SocketTestHelper):
+    endpoints = helper.fake_endpoints()
+    payloads = [faker.binary(111) for _ in range(2)]
+    uid = faker.pyint()
+    messages = {
+        uid: PacketBundle(*reversed(endpoints), [
+            Packet(*reversed(endpoints), 0, 0, set(), payloads[0]),
+            Packet(*reversed(endpoints), 1, 0, set(), payloads[1]),
+        ]),
+    }
+    socket = helper.create_connected_socket(*endpoints)
+
+    helper.feed_messages(messages)
+    ret = socket.recv(len(payloads[0]) + len(payloads[1]))
+    socket.close()
+
+    assert ret == payloads[0] + payloads[1]
+    helper.wait_listener_idle()
+    helper.mock_store.add_flags.assert_called_once_with([uid], [imapclient.SEEN])
+
+
+@pytest.mark.timeout(5)
+def test_without_global_mutex(faker: Faker, helper: SocketTestHelper):
+    endpoints = helper.fake_endpoints()
+    payload = faker.binary(111)
+    uid = faker.pyint()
+    messages = {
+        uid: Packet(*reversed(endpoints), 0, 0, set(), payload),
+    }
+    socket = helper.create_connected_socket(*endpoints)
+    locked = threading.Event()
+    release = threading.Event()
+
+    def hold_mutex():
+        with helper.mailbox._mutex:
+            locked.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold_mutex)
+    thread.start()
+    locked.wait()
+    helper.feed_messages(messages)
+    ret = socket.recv(len(payload), 1)
+    release.set()
+    thread.join()
+    socket.close()
+
+    assert ret == payload
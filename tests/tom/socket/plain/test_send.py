@@ -1,3 +1,4 @@
+import threading
 import pytest
 from ...socket_test_helper import SocketTestHelper
 from faker import Faker
@@ -44,6 +45,34 @@ def test_retransmit(faker: Faker, helper: SocketTestHelper):
     helper.assert_sent(Packet(*endpoints, 0, 1, set(), payload, is_syn=True), 1.5, 0.5)
 
 
+@pytest.mark.timeout(5)
+def test_retransmit_multiple(faker: Faker, helper: SocketTestHelper):
+    payloads = [faker.binary(111) for _ in range(3)]
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+
+    for payload in payloads:
+        socket.send(payload)
+    for i, payload in enumerate(payloads):
+        helper.assert_sent(Packet(*endpoints, i, 0, set(), payload, is_syn=i == 0))
+    helper.feed_messages({faker.pyint(): Packet(*reversed(endpoints), -1, 0, {(1, 0)}, b'')})
+    helper.assert_sent(Packet(*endpoints, 0, 1, set(), payloads[0], is_syn=True), 1.5, 0.5)
+    helper.assert_sent(Packet(*endpoints, 2, 1, set(), payloads[2]), 0.5)
+
+
+@pytest.mark.timeout(8)
+def test_retransmit_backoff(faker: Faker, helper: SocketTestHelper):
+    helper.mock_config['tom']['MaxRetransmitTime'] = 10000
+    payload = faker.binary(111)
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+
+    socket.send(payload)
+    helper.assert_sent(Packet(*endpoints, 0, 0, set(), payload, is_syn=True))
+    helper.assert_sent(Packet(*endpoints, 0, 1, set(), payload, is_syn=True), 1.5, 0.5)
+    helper.assert_sent(Packet(*endpoints, 0, 2, set(), payload, is_syn=True), 2.5, 1.5)
+
+
 @pytest.mark.timeout(5)
 def test_no_retransmit_after_pure_ack(faker: Faker, helper: SocketTestHelper):
     payload = faker.binary(111)
@@ -78,3 +107,133 @@ def test_many_packets(faker: Faker, helper: SocketTestHelper):
     for i in range(5000):
         socket.send(payload)
         helper.feed_messages({uid + i: Packet(*reversed(endpoints), -1, 0, {(i, 0)}, b'')})
+
+
+@pytest.mark.timeout(5)
+def test_coalesce(faker: Faker, helper: SocketTestHelper):
+    helper.mock_config['tom']['CoalesceDelay'] = 500
+    payloads = [faker.binary(111) for _ in range(3)]
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+
+    for payload in payloads:
+        socket.send(payload)
+    helper.assert_sent(Packet(*endpoints, 0, 0, set(), b''.join(payloads), is_syn=True), 1, 0.3)
+    helper.assert_no_packets_sent(0.2)
+
+
+@pytest.mark.timeout(5)
+def test_coalesce_size(faker: Faker, helper: SocketTestHelper):
+    helper.mock_config['tom']['CoalesceDelay'] = 500
+    helper.mock_config['tom']['CoalesceSize'] = 200
+    payloads = [faker.binary(111) for _ in range(3)]
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+
+    for payload in payloads:
+        socket.send(payload)
+    helper.assert_sent(Packet(*endpoints, 0, 0, set(), payloads[0] + payloads[1], is_syn=True), 0.2)
+    helper.assert_sent(Packet(*endpoints, 1, 0, set(), payloads[2]), 1, 0.3)
+
+
+@pytest.mark.timeout(5)
+def test_coalesce_close(faker: Faker, helper: SocketTestHelper):
+    helper.mock_config['tom']['CoalesceDelay'] = 500
+    payload = faker.binary(111)
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+
+    socket.send(payload)
+    socket.close()
+    helper.assert_sent(Packet(*endpoints, 0, 0, set(), payload, is_syn=True), 0.2)
+
+
+@pytest.mark.timeout(5)
+def test_nodelay(faker: Faker, helper: SocketTestHelper):
+    helper.mock_config['tom']['CoalesceDelay'] = 500
+    payloads = [faker.binary(111) for _ in range(2)]
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+
+    socket.send(payloads[0])
+    socket.set_nodelay(True)
+    helper.assert_sent(Packet(*endpoints, 0, 0, set(), payloads[0], is_syn=True), 0.2)
+    socket.send(payloads[1])
+    helper.assert_sent(Packet(*endpoints, 1, 0, set(), payloads[1]), 0.2)
+
+
+@pytest.mark.timeout(5)
+def test_tracked(faker: Faker, helper: SocketTestHelper):
+    payload = faker.binary(111)
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+
+    future = socket.send_tracked(payload)
+    helper.assert_sent(Packet(*endpoints, 0, 0, set(), payload, is_syn=True))
+    assert not future.done()
+    helper.feed_messages({faker.pyint(): Packet(*reversed(endpoints), -1, 0, {(0, 0)}, b'')})
+    assert future.result(1) is None
+
+
+@pytest.mark.timeout(5)
+def test_tracked_callback(faker: Faker, helper: SocketTestHelper):
+    payload = faker.binary(111)
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+    unblocked = []
+    called = threading.Event()
+
+    def callback(future):
+        # the socket must not be locked while running callbacks of applications
+        thread = threading.Thread(target=socket.send, args=(payload,))
+        thread.start()
+        thread.join(0.5)
+        unblocked.append(not thread.is_alive())
+        called.set()
+
+    future = socket.send_tracked(payload)
+    future.add_done_callback(callback)
+    helper.assert_sent(Packet(*endpoints, 0, 0, set(), payload, is_syn=True))
+    helper.feed_messages({faker.pyint(): Packet(*reversed(endpoints), -1, 0, {(0, 0)}, b'')})
+    assert called.wait(1)
+    assert unblocked == [True]
+
+
+@pytest.mark.timeout(5)
+def test_tracked_cancel(faker: Faker, helper: SocketTestHelper):
+    payload = faker.binary(111)
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+
+    future = socket.send_tracked(payload)
+    helper.assert_sent(Packet(*endpoints, 0, 0, set(), payload, is_syn=True))
+    assert future.cancel()
+    helper.feed_messages({faker.pyint(): Packet(*reversed(endpoints), -1, 0, {(0, 0)}, b'')})
+    helper.wait_listener_idle()
+    assert future.cancelled()
+
+
+@pytest.mark.timeout(5)
+def test_tracked_timeout(faker: Faker, helper: SocketTestHelper):
+    payload = faker.binary(111)
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+
+    future = socket.send_tracked(payload)
+    with pytest.raises(Exception) as execinfo:
+        future.result(3)
+    assert execinfo.match('connection timed out')
+
+
+@pytest.mark.timeout(5)
+def test_tracked_close(faker: Faker, helper: SocketTestHelper):
+    helper.mock_config['tom']['CoalesceDelay'] = 500
+    payload = faker.binary(111)
+    endpoints = helper.fake_endpoints()
+    socket = helper.create_connected_socket(*endpoints)
+
+    future = socket.send_tracked(payload)
+    socket.close()
+    with pytest.raises(Exception) as execinfo:
+        future.result(1)
+    assert execinfo.match('socket already closed')
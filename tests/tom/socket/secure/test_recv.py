@@ -22,6 +22,7 @@ def test_simple(faker: Faker, helper: SocketTestHelper):
     socket.close()
 
     assert ret == payload
+    helper.wait_listener_idle()
     helper.mock_store.add_flags.assert_called_with([uid], [imapclient.SEEN])
 
 
@@ -1,5 +1,5 @@
 from typing import Dict, Tuple, Deque, Optional, Callable, Any, List, Type
-from unittest.mock import patch, MagicMock, Mock, _patch
+from unittest.mock import patch, MagicMock, _patch
 from collections import deque
 import time
 import threading
@@ -8,7 +8,8 @@ from imapclient.response_types import Envelope, Address
 from faker import Faker
 import doubleratchet.header
 from src.tom import Mailbox, Credential, Endpoint, Socket, Epoll
-from src.tom._mailbox.packet import Packet, PlainPacket, SecurePacket
+from src.tom._mailbox.packet import Packet, PlainPacket, SecurePacket, EncodedPacket, PacketBundle, FastMessage
+from src.tom._mailbox.packet import packet_pb2
 from src.crypto.doubleratchet import KeyPair
 
 
@@ -27,10 +28,17 @@ class SocketTestHelper:
 
     __faker: Faker
     __messages: Dict[int, Packet]
+    __uids: Dict[int, int]                  # message id in tests -> IMAP UID
+    __next_uid: int
     __send_queue: Deque[Packet]
     __closed: bool = False
+    __listener_idle: bool = False
+    __exists_notified: int = 0              # number of EXISTS responses sent
+    __exists_searched: int = 0              # EXISTS responses sent before the latest search for new emails
+    __check_requested: bool = False         # whether to send an EXISTS response even if there are no messages
 
     mock_store: MagicMock
+    __store: MagicMock
     mock_listener: MagicMock
     mock_transport: MagicMock
     __mock_imapclient: MagicMock
@@ -46,35 +54,80 @@ class SocketTestHelper:
         self.__cv_listen = threading.Condition(self.__mutex)
         self.__faker = Faker()
         self.__messages = {}
+        self.__uids = {}
+        self.__next_uid = 1
         self.__send_queue = deque()
         self.mock_config = {
             'tom': {
                 'X-Mailer': 'Mail.im',
                 'RTO': 1000,
+                'MinRTO': 1000,
+                'MaxRTO': 60000,
                 'ATO': 1000,
-                'MaxAttempts': 2,
+                'MaxRetransmitTime': 1500,
+                'CoalesceDelay': 0,
+                'CoalesceSize': 65536,
+                'LegacyAcks': True,
+                'PacketBundles': False,
+                'MaxBundleSize': 1048576,
+                'FetchBatchSize': 100,
+                'IdleRefresh': 1500000,
+                'FetchDebounce': 0,
+                'FetchDebounceGap': 0,
+                'RejectCacheSize': 10000,
+                'RejectCacheTTL': 600000,
+                'GCRetention': None,
+                'GCArchiveFolder': None,
+                'GCInterval': 60000,
+                'GCBatchSize': 1000,
+                'IMAPTimeout': 60000,
+                'IdleWatchdog': 300000,
+                'ReconnectDelay': 1000,
+                'MaxReconnectDelay': 300000,
+                'IMAPCompress': True,
+                'IMAPCompressIdle': False,
+                'InboundWorkers': 4,
+                'TaskWorkers': 4,
+                'SMTPPoolSize': 4,
+                'SMTPIdleTimeout': 60000,
+                'SMTPHealthCheck': 10000,
             }
         }
         patch_config = patch.dict('src.config.config', self.mock_config)
         patch_config.start()
+        # tests use arbitrary message ids, which are mapped to ascending UIDs in the order messages are fed
         self.mock_store = MagicMock()
-        self.mock_store.search.side_effect = self.__search_stub
-        self.mock_store.fetch.side_effect = self.__fetch_stub
         self.mock_store.add_flags.side_effect = self.__add_flags_stub
+        self.__store = MagicMock()
+        self.__store.select_folder.return_value = {b'UIDVALIDITY': 1}
+        self.__store.search.side_effect = self.__search_stub
+        self.__store.fetch.side_effect = self.__fetch_stub
+        self.__store.add_flags.side_effect = \
+            lambda uids, flags: self.mock_store.add_flags(self.__message_ids(uids), flags)
         self.mock_listener = MagicMock()
         idle_check_stub = self.__idle_check_stub()
         self.mock_listener.idle_check.side_effect = lambda *args, **kwargs: next(idle_check_stub, None)
         self.__patches = [
             patch_config,
-            patch('smtplib.SMTP', **{'return_value.sendmail.side_effect': self.__sendmail_stub}),
-            patch('src.tom._mailbox.imapclient.IMAPClient', side_effect=[self.mock_store, self.mock_listener]),
+            patch('smtplib.SMTP', **{
+                'return_value.sendmail.side_effect': self.__sendmail_stub,
+                'return_value.has_extn.return_value': False,
+            }),
+            patch('src.tom._mailbox.imapclient.IMAPClient', side_effect=[self.__store, self.mock_listener]),
             patch.object(PlainPacket, 'from_message', packet_from_message_stub(PlainPacket)),
-            patch.object(PlainPacket, 'to_message', lambda x: Mock(as_bytes=lambda: x)),
+            patch.object(PlainPacket, 'to_bytes', lambda x, *args: x),
             patch.object(SecurePacket, 'from_message', packet_from_message_stub(SecurePacket)),
-            patch.object(SecurePacket, 'to_message', lambda x: Mock(as_bytes=lambda: x)),
+            patch.object(SecurePacket, 'to_bytes', lambda x, *args: x),
+            patch.object(EncodedPacket, 'encode', self.__encoded_packet_encode_stub()),
+            patch.object(EncodedPacket, 'to_bytes', self.__encoded_packet_to_bytes_stub),
+            patch.object(PacketBundle, 'from_message', packet_from_message_stub(PacketBundle)),
+            patch.object(PacketBundle, 'to_bytes', lambda x, *args: x),
+            patch.object(PacketBundle, 'payload_size', self.__payload_size_stub),
             patch.object(SecurePacket, 'decrypt', lambda x, *args: x.body),
             patch.object(SecurePacket, 'encrypt', self.__secure_packet_encrypt_stub),
             patch.object(KeyPair, 'generate', lambda: KeyPair()),
+            patch.object(FastMessage, 'parse', lambda x: None),
+            patch.object(Packet, 'decoder_for', lambda x: type(x)),
             patch('email.message_from_bytes', lambda x: x),
         ]
         for patch_ in self.__patches:
@@ -133,8 +186,28 @@ class SocketTestHelper:
     def feed_messages(self, messages: Dict[int, Packet]):
         assert messages, 'feeding no messages'
         with self.__cv_listen:
+            for message_id in messages:
+                self.__uids[message_id] = self.__next_uid
+                self.__next_uid += 1
             self.__messages.update(messages)
-            self.__cv_listen.notify(1)
+            self.__cv_listen.notify_all()
+
+    def wait_listener_idle(self, timeout: float = 1):
+        """
+        Wait until the mailbox has finished handling fed messages, as packets are processed in worker threads.
+
+        New emails are checked one search at a time, so once a check has started after the latest notification, the
+        search of another requested check marks the end of it.
+        """
+        def searched():
+            return self.__listener_idle and not self.__check_requested \
+                and self.__exists_searched == self.__exists_notified
+
+        with self.__cv_listen:
+            assert self.__cv_listen.wait_for(searched, timeout), 'listener is still busy'
+            self.__check_requested = True
+            self.__cv_listen.notify_all()
+            assert self.__cv_listen.wait_for(searched, timeout), 'listener is still busy'
 
     def defer(self, func: Callable[[], Any], delay: float):
 
@@ -168,6 +241,10 @@ class SocketTestHelper:
     def __sendmail_stub(self, from_address, to_address, packet: Packet):
         assert from_address == packet.from_.address
         assert to_address == packet.to.address
+        if isinstance(packet, PacketBundle):
+            for inner_packet in packet.packets:
+                self.__sendmail_stub(from_address, to_address, inner_packet.to_bytes())
+            return
         with self.__mutex:
             self.__send_queue.append(packet)
         self.__sem_send.release()
@@ -184,24 +261,48 @@ class SocketTestHelper:
             while True:
                 if self.__closed:
                     return
-                if self.__messages:
+                if self.__messages or self.__check_requested:
+                    self.__check_requested = False
+                    self.__exists_notified += 1
                     yield [(len(self.__messages), b'EXISTS')]
+                self.__listener_idle = True
+                self.__cv_listen.notify_all()
                 self.__cv_listen.wait()
+                self.__listener_idle = False
 
     def __search_stub(self, criteria):
-        assert criteria == 'UNSEEN', 'unsupported search criteria'
-        with self.__mutex:
-            return list(self.__messages.keys())
+        with self.__cv_listen:
+            self.__exists_searched = self.__exists_notified
+            self.__cv_listen.notify_all()
+            uids = sorted(self.__uids[message_id] for message_id in self.__messages)
+            if criteria == 'UNSEEN':
+                return uids
+            assert criteria[0] == 'UID' and criteria[2:] == [
+                'UNSEEN',
+                'HEADER', 'X-Mailer', self.mock_config['tom']['X-Mailer'],
+                'HEADER', 'Content-Type', 'application/x-mailim-packet',
+            ], 'unsupported search criteria'
+            begin, end = criteria[1].split(':')
+            assert end == '*', 'unsupported search criteria'
+            # `n:*` includes the largest UID even if it is less than n
+            begin, end = sorted((int(begin), self.__next_uid - 1))
+            return [uid for uid in uids if begin <= uid <= end]
 
     def __fetch_stub(self, uids, data):
         with self.__mutex:
+            message_ids = {uid: message_id for message_id, uid in self.__uids.items()}
             return {
                 uid: {
-                    b'ENVELOPE': self.__make_envelope(self.__messages[uid]),
-                    b'BODY[]': self.__messages[uid],
-                } for uid in uids
+                    b'ENVELOPE': self.__make_envelope(self.__messages[message_ids[uid]]),
+                    b'BODY[]': self.__messages[message_ids[uid]],
+                } for uid in uids if message_ids.get(uid) in self.__messages
             }
 
+    def __message_ids(self, uids):
+        with self.__mutex:
+            message_ids = {uid: message_id for message_id, uid in self.__uids.items()}
+            return [message_ids[uid] for uid in uids]
+
     def __add_flags_stub(self, uids, flags):
         assert flags == [SEEN], 'unsupported flags'
         with self.__mutex:
@@ -222,6 +323,32 @@ class SocketTestHelper:
             body,
             plain_packet.is_syn)
 
+    @staticmethod
+    def __encoded_packet_encode_stub():
+        encode = EncodedPacket.encode
+
+        def stub(packet: Packet) -> EncodedPacket:
+            if isinstance(packet, SecurePacket):
+                # stubbed secure packets cannot be serialized, keep them as the data
+                return EncodedPacket(
+                    packet.from_, packet.to, True, packet, SocketTestHelper.__payload_size_stub(packet))
+            return encode(packet)
+        return stub
+
+    @staticmethod
+    def __encoded_packet_to_bytes_stub(packet: EncodedPacket, *args) -> Packet:
+        if packet.secure:
+            return packet.data
+        return PlainPacket.from_pb((packet.from_, packet.to), packet_pb2.PlainPacket.FromString(packet.data))
+
+    @staticmethod
+    def __payload_size_stub(packet: Packet) -> int:
+        if isinstance(packet, EncodedPacket):
+            return packet.payload_size
+        if isinstance(packet, SecurePacket):
+            return len(packet.body.payload) if isinstance(packet.body, PlainPacket) else len(packet.body)
+        return len(packet.payload)
+
     def __fake_credential(self) -> Credential:
         return Credential(
             host=self.__faker.hostname(),
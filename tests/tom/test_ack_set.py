@@ -0,0 +1,96 @@
+import pickle
+from src.tom._mailbox.packet import AckSet, packet_pb2
+
+
+def test_add():
+    acks = AckSet()
+    for seq in [3, 1, 2, 7, 5, 6, 2]:
+        acks.add((seq, 0))
+    acks.add((2, 1))
+
+    assert len(acks) == 7
+    assert list(acks.ranges()) == [(1, 4, 0), (5, 8, 0), (2, 3, 1)]
+    assert (3, 0) in acks
+    assert (4, 0) not in acks
+    assert (3, 1) not in acks
+    assert acks == {(1, 0), (2, 0), (3, 0), (5, 0), (6, 0), (7, 0), (2, 1)}
+
+
+def test_add_range():
+    acks = AckSet()
+    acks.add_range(0, 3, 0)
+    acks.add_range(5, 8, 0)
+    acks.add_range(10, 12, 0)
+    acks.add_range(2, 6, 0)
+
+    assert len(acks) == 10
+    assert list(acks.ranges()) == [(0, 8, 0), (10, 12, 0)]
+
+
+def test_discard():
+    acks = AckSet()
+    acks.add_range(0, 10, 0)
+    acks.discard((5, 0))
+    acks.discard((5, 0))
+    acks.discard((5, 1))
+
+    assert len(acks) == 9
+    assert list(acks.ranges()) == [(0, 5, 0), (6, 10, 0)]
+
+
+def test_subtract():
+    acks = AckSet()
+    acks.add_range(0, 10, 0)
+    acks.add_range(20, 30, 0)
+    acks.add_range(0, 10, 1)
+    other = AckSet()
+    other.add_range(5, 25, 0)
+    other.add_range(0, 10, 1)
+
+    acks -= other
+
+    assert len(acks) == 10
+    assert list(acks.ranges()) == [(0, 5, 0), (25, 30, 0)]
+    acks -= {(0, 0), (29, 0)}
+    assert list(acks.ranges()) == [(1, 5, 0), (25, 29, 0)]
+
+
+def test_copy():
+    acks = AckSet({(0, 0), (1, 0)})
+    copy = AckSet(acks)
+    copy.add((2, 0))
+
+    assert acks == {(0, 0), (1, 0)}
+    assert copy == {(0, 0), (1, 0), (2, 0)}
+
+
+def test_pickle():
+    acks = AckSet({(0, 0), (1, 0), (5, 2)})
+
+    assert pickle.loads(pickle.dumps(acks)) == acks
+
+
+def test_pb():
+    acks = AckSet()
+    acks.add_range(0, 1000, 0)
+    acks.add((1001, 1))
+    legacy = packet_pb2.PacketId()
+    legacy.seq = 2000
+    legacy.attempt = 0
+
+    ranges = acks.to_pb()
+
+    assert len(ranges) == 2
+    assert AckSet.from_pb([], ranges) == acks
+    assert AckSet.from_pb([legacy], ranges) == acks | {(2000, 0)}
+
+
+def test_legacy_pb():
+    acks = AckSet({(1, 0), (2, 0), (3, 1)})
+    header = packet_pb2.PlainPacketHeader()
+
+    acks.write_pb(header, True)
+
+    assert len(header.acks) == 3
+    assert not header.ack_ranges
+    assert AckSet.from_pb(header.acks, []) == acks
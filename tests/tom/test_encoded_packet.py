@@ -0,0 +1,41 @@
+from dataclasses import replace
+from faker import Faker
+from src.tom._mailbox.packet import PlainPacket, SecurePacket, EncodedPacket, PacketBundle, FastMessage
+
+
+def test_plain_for_attempt(faker: Faker, make_plain):
+    packet = make_plain(faker.pyint())
+    acks = set((faker.pyint(), faker.pyint()) for i in range(10))
+    attempt = faker.pyint()
+
+    encoded = EncodedPacket.encode(packet).for_attempt(attempt, acks)
+
+    assert not encoded.secure
+    assert encoded.payload_size == len(packet.payload)
+    assert PlainPacket.from_message(encoded.to_message()) == replace(packet, attempt=attempt, acks=acks)
+
+
+def test_secure_for_attempt(faker: Faker, make_secure):
+    packet = make_secure()
+
+    encoded = EncodedPacket.encode(packet)
+
+    assert encoded.secure
+    assert encoded.payload_size == len(packet.body)
+    assert encoded.for_attempt(faker.pyint(), set()) is encoded
+    assert SecurePacket.from_message(encoded.to_message()) == packet
+
+
+def test_to_bytes(make_secure):
+    encoded = EncodedPacket.encode(make_secure())
+    assert encoded.to_bytes() == encoded.to_message().as_bytes()
+
+
+def test_bundle(endpoints, make_plain):
+    packets = [replace(make_plain(i), attempt=1, acks={(i, 0)}) for i in range(3)]
+    bundle = PacketBundle(*endpoints, [EncodedPacket.encode(packets[0]).for_attempt(1, {(0, 0)}), *packets[1:]])
+
+    bundle_recv = PacketBundle.from_message(FastMessage.parse(bundle.to_bytes()))
+
+    assert not bundle.secure
+    assert bundle_recv == PacketBundle(*endpoints, packets)
@@ -0,0 +1,82 @@
+import email
+from email.mime.application import MIMEApplication
+from email.utils import formataddr
+import pytest
+from faker import Faker
+from src.tom import Endpoint
+from src.tom._mailbox.packet import FastMessage
+
+
+def make_message(from_: Endpoint, to: Endpoint, payload: bytes) -> bytes:
+    msg = MIMEApplication(payload, 'x-mailim-packet', email.encoders.encode_base64)
+    msg.add_header('X-Mailer', 'Mail.im')
+    msg.add_header('From', formataddr((from_.port, from_.address)))
+    msg.add_header('To', formataddr((to.port, to.address)))
+    return msg.as_bytes()
+
+
+@pytest.mark.parametrize('size', [0, 1, 57, 58, 1000])
+def test_build(faker: Faker, endpoints, size: int):
+    payload = faker.binary(size)
+    data = FastMessage.build('application/x-mailim-packet', 'Mail.im', *endpoints, payload)
+    assert data == make_message(*endpoints, payload)
+
+
+@pytest.mark.parametrize('port', ['Jane Doe', '"quoted"', 'a,b', 'ünïcode'])
+def test_build_special_names(faker: Faker, port: str):
+    endpoints = Endpoint(faker.email(), port), Endpoint(faker.email(), faker.uuid4())
+    payload = faker.binary(111)
+    data = FastMessage.build('application/x-mailim-packet', 'Mail.im', *endpoints, payload)
+    assert data == make_message(*endpoints, payload)
+
+
+def test_build_long_header(faker: Faker):
+    endpoints = Endpoint(faker.email(), 'x' * 100), Endpoint(faker.email(), faker.uuid4())
+    assert FastMessage.build('application/x-mailim-packet', 'Mail.im', *endpoints, b'') is None
+
+
+@pytest.mark.parametrize('line_ending', [b'\n', b'\r\n'])
+def test_parse(faker: Faker, endpoints, line_ending: bytes):
+    data = make_message(*endpoints, faker.binary(111)).replace(b'\n', line_ending)
+    msg = FastMessage.parse(data)
+    expected = email.message_from_bytes(data)
+    for name in ['X-Mailer', 'From', 'To', 'x-mailer', 'Subject']:
+        assert msg.get(name) == expected.get(name)
+    assert msg.get_content_type() == expected.get_content_type()
+    assert msg.get_payload(decode=True) == expected.get_payload(decode=True)
+
+
+@pytest.mark.parametrize('data', [
+    b'Content-Type: application/x-mailim-packet\nContent-Transfer-Encoding: base64\nTo: a\n <a@b.c>\n\nAAAA\n',
+    b'Content-Type: application/x-mailim-packet; a=b\nContent-Transfer-Encoding: base64\n\nAAAA\n',
+    b'Content-Type: multipart/mixed\nContent-Transfer-Encoding: base64\n\nAAAA\n',
+    b'Content-Type: application/x-mailim-packet\nContent-Transfer-Encoding: quoted-printable\n\nAAAA\n',
+    b'Content-Type: application/x-mailim-packet\nContent-Transfer-Encoding: base64\n\nAAA\n',
+    b'Content-Type: application/x-mailim-packet\nContent-Transfer-Encoding: base64\nTo: \xff\n\nAAAA\n',
+    b'Content-Type: application/x-mailim-packet\nContent-Transfer-Encoding: base64\n',
+])
+def test_parse_unusual(data: bytes):
+    assert FastMessage.parse(data) is None
+
+
+def test_build_binary(faker: Faker, endpoints):
+    payload = faker.binary(1000) + b'\r\n\n\r'
+    data = FastMessage.build('application/x-mailim-packet', 'Mail.im', *endpoints, payload, binary=True)
+    assert data.endswith(b'\r\n\r\n' + payload)
+    assert b'Content-Transfer-Encoding: binary\r\n' in data
+    assert FastMessage.parse(data).get_payload(decode=True) == payload
+    assert email.message_from_bytes(data).get_payload(decode=True) == payload
+
+
+def test_as_bytes_binary(faker: Faker, endpoints):
+    data = FastMessage.as_bytes(email.message_from_bytes(make_message(*endpoints, faker.binary(111))), binary=True)
+    assert data.count(b'\n') == data.count(b'\r\n')
+
+
+def test_parse_decoded(faker: Faker, endpoints):
+    payload = faker.binary(111)
+    data = make_message(*endpoints, payload)
+    header = data[:data.index(b'\n\n') + 2]
+    msg = FastMessage.parse(header, payload)
+    assert msg.get('X-Mailer') == 'Mail.im'
+    assert msg.get_payload(decode=True) == payload
@@ -1,5 +1,6 @@
 from unittest.mock import patch, MagicMock
 import socket
+import zlib
 import pytest
 from faker import Faker
 from src.tom._mailbox.imapclient import IMAPClient
@@ -49,3 +50,59 @@ def test_selfpipe(faker: Faker, mock_imapclient: MagicMock, mock_select: MagicMo
     ret = IMAPClient.idle_check(mock_imapclient, timeout, selfpipe)
 
     assert ret is None
+
+
+def test_eof(faker: Faker, mock_imapclient: MagicMock, mock_select: MagicMock):
+    mock_select.return_value = [mock_imapclient._sock], [], []
+    mock_imapclient._imap._get_line.side_effect = [b'* 4 EXISTS', IMAPClient.AbortError('socket error: EOF')]
+
+    assert IMAPClient.idle_check(mock_imapclient, faker.pyfloat()) == [(4, b'EXISTS')]
+
+    mock_imapclient._imap._get_line.side_effect = IMAPClient.AbortError('socket error: EOF')
+    with pytest.raises(IMAPClient.AbortError):
+        IMAPClient.idle_check(mock_imapclient, faker.pyfloat())
+
+
+def test_fetch_literal8(mock_imapclient: MagicMock):
+    mock_imapclient.use_uid = True
+    mock_imapclient._imap._command_complete.return_value = 'OK', []
+    mock_imapclient._imap._untagged_response.return_value = 'OK', [
+        (b'1 (UID 5 BODY[HEADER] {3}', b'a\r\n'),
+        (b' BINARY[1] ~{4}', b'\x00\r\n\xff'),
+        b')',
+    ]
+
+    ret = IMAPClient.fetch(mock_imapclient, [5], ['BODY.PEEK[HEADER]', 'BINARY.PEEK[1]'])
+
+    assert ret[5][b'BODY[HEADER]'] == b'a\r\n'
+    assert ret[5][b'BINARY[1]'] == b'\x00\r\n\xff'
+
+
+def test_compress_unsupported(mock_imapclient: MagicMock):
+    mock_imapclient.has_capability.return_value = False
+
+    assert not IMAPClient.compress(mock_imapclient)
+    mock_imapclient._imap._simple_command.assert_not_called()
+
+
+def test_compress(mock_imapclient: MagicMock):
+    client_sock, server_sock = socket.socketpair()
+    mock_imapclient.has_capability.return_value = True
+    mock_imapclient._imap._simple_command.return_value = 'OK', [b'DEFLATE active']
+    mock_imapclient._imap.sock = client_sock
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    assert IMAPClient.compress(mock_imapclient)
+    mock_imapclient._imap._simple_command.assert_called_once_with('COMPRESS', 'DEFLATE')
+
+    imap = mock_imapclient._imap
+    imap.send(b'A1 NOOP\r\n')
+    assert decompressor.decompress(server_sock.recv(1024)) == b'A1 NOOP\r\n'
+    server_sock.sendall(compressor.compress(b'* 1 EXISTS\r\n{3}\r\nabcA1 OK\r\n') + compressor.flush(zlib.Z_SYNC_FLUSH))
+    assert imap.file.readline() == b'* 1 EXISTS\r\n'
+    assert imap.file.readline() == b'{3}\r\n'
+    assert imap.file.read(3) == b'abc'
+    assert imap.file.readline() == b'A1 OK\r\n'
+    client_sock.close()
+    server_sock.close()
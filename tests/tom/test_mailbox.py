@@ -1,7 +1,20 @@
 from unittest.mock import patch, call, MagicMock
 import pytest
+import imapclient
+import pickle
+import threading
+import time
+import select
 from faker import Faker
-from src.tom import Credential, Mailbox
+from src.tom import Credential, Mailbox, Endpoint, Socket
+from src.tom._mailbox.packet import PlainPacket
+from src.config import config
+
+
+HEADER_CRITERIA = [
+    'HEADER', 'X-Mailer', config['tom']['X-Mailer'],
+    'HEADER', 'Content-Type', 'application/x-mailim-packet',
+]
 
 
 @pytest.mark.timeout(5)
@@ -27,12 +40,13 @@ def test_mailbox(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker):
     ])
 
     IMAPClient.assert_has_calls([
-        call(imap.host, imap.port, ssl=True, use_uid=True),
-        call(imap.host, imap.port, ssl=True, use_uid=True),
+        call(imap.host, imap.port, ssl=True, use_uid=True, timeout=config['tom']['IMAPTimeout'] / 1000),
+        call(imap.host, imap.port, ssl=True, use_uid=True, timeout=config['tom']['IMAPTimeout'] / 1000),
     ])
 
     store.assert_has_calls([
         call.login(imap.username, imap.password),
+        call.compress(),
         call.select_folder('INBOX'),
     ])
 
@@ -40,9 +54,520 @@ def test_mailbox(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker):
         call.login(imap.username, imap.password),
         call.select_folder('INBOX'),
     ])
+    listener.compress.assert_not_called()
 
     mailbox.close()
 
     SMTP.return_value.close.assert_called_once()
     store.logout.assert_called_once()
     listener.logout.assert_called_once()
+
+
+@pytest.mark.timeout(5)
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_state_file(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker, tmp_path):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    state_file = str(tmp_path / 'state')
+
+    endpoints = Endpoint(faker.email(), faker.uuid4()), Endpoint(faker.email(), faker.uuid4())
+    unroutable = PlainPacket(*endpoints, 0, 0, set(), b'').to_message().as_bytes()
+
+    def run(search_results, fetch_results, uid_validity=1):
+        store = MagicMock()
+        listener = MagicMock()
+        IMAPClient.side_effect = [store, listener]
+        store.select_folder.return_value = {b'UIDVALIDITY': uid_validity}
+        store.search.return_value = search_results
+        store.fetch.return_value = {uid: {b'BODY[]': body} for uid, body in fetch_results.items()}
+        listener.idle_check.return_value = None  # skip idle check in tests
+        mailbox = Mailbox(smtp, imap, state_file=state_file)
+        mailbox.close()
+        return store
+
+    store = run([4, 5, 6], {4: b'not a packet', 5: unroutable, 6: unroutable})
+    store.search.assert_called_once_with(['UID', '1:*', 'UNSEEN'] + HEADER_CRITERIA)
+    store.fetch.assert_called_once_with([4, 5, 6], ['BODY.PEEK[]'])
+
+    # unroutable packets are examined again, invalid ones and messages up to the watermark are not
+    store = run([6, 8], {5: unroutable, 8: unroutable})
+    store.search.assert_called_once_with(['UID', '7:*', 'UNSEEN'] + HEADER_CRITERIA)
+    store.fetch.assert_called_once_with([5, 6, 8], ['BODY.PEEK[]'])
+
+    # 6 is gone
+    store = run([8], {})
+    store.search.assert_called_once_with(['UID', '9:*', 'UNSEEN'] + HEADER_CRITERIA)
+    store.fetch.assert_called_once_with([5, 8], ['BODY.PEEK[]'])
+
+    # UIDs have been reassigned
+    store = run([], {}, uid_validity=2)
+    store.search.assert_called_once_with(['UID', '1:*', 'UNSEEN'] + HEADER_CRITERIA)
+    store.fetch.assert_not_called()
+
+
+@pytest.mark.timeout(5)
+@patch.dict('src.config.config', {'tom': dict(config['tom'], FetchBatchSize=2)})
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_fetch_batches(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+
+    store = MagicMock()
+    listener = MagicMock()
+    IMAPClient.side_effect = [store, listener]
+    store.search.return_value = [1, 2, 3, 4, 5]
+    store.fetch.side_effect = lambda uids, data: {uid: {b'BODY[]': b'not a packet'} for uid in uids}
+    listener.idle_check.return_value = None  # skip idle check in tests
+
+    mailbox = Mailbox(smtp, imap)
+    mailbox.close()
+
+    store.fetch.assert_has_calls([
+        call([1, 2], ['BODY.PEEK[]']),
+        call([3, 4], ['BODY.PEEK[]']),
+        call([5], ['BODY.PEEK[]']),
+    ])
+
+
+@pytest.mark.timeout(5)
+@patch.dict('src.config.config', {'tom': dict(config['tom'], FetchDebounce=0)})
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_header_filter_fallback(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    headers = {
+        1: b'X-Mailer: Foo\r\nContent-Type: text/plain\r\n\r\n',
+        2: 'X-Mailer: {}\r\nContent-Type: application/x-mailim-packet-secure\r\n\r\n'
+            .format(config['tom']['X-Mailer']).encode(),
+        3: 'X-Mailer: {}\r\nContent-Type: text/plain\r\n\r\n'.format(config['tom']['X-Mailer']).encode(),
+        4: 'X-Mailer: {}\r\nContent-Type: application/x-mailim-packet\r\n\r\n'
+            .format(config['tom']['X-Mailer']).encode(),
+    }
+    searched = threading.Event()
+    idle_check_results = iter([[(4, b'EXISTS')], None])
+
+    def search(criteria):
+        if 'HEADER' in criteria:
+            raise imapclient.exceptions.IMAPClientError('SEARCH command error: BAD')
+        searched.set()
+        return [1, 2, 3] if not store.fetch.called else [1, 2, 3, 4]
+
+    def idle_check(*args, **kwargs):
+        # notify only after the first check has started, so that another check follows
+        searched.wait()
+        return next(idle_check_results)
+
+    def fetch(uids, data):
+        if data == ['BODY.PEEK[]']:
+            return {uid: {b'BODY[]': b'not a packet'} for uid in uids}
+        return {uid: {b'BODY[HEADER.FIELDS (X-MAILER CONTENT-TYPE)]': headers[uid]} for uid in uids}
+
+    store = MagicMock()
+    listener = MagicMock()
+    IMAPClient.side_effect = [store, listener]
+    store.search.side_effect = search
+    store.fetch.side_effect = fetch
+    listener.idle_check.side_effect = idle_check
+
+    mailbox = Mailbox(smtp, imap)
+    mailbox.close()
+
+    # neither foreign emails nor invalid packets are downloaded again by the next check
+    assert store.fetch.call_args_list == [
+        call([1, 2, 3], ['BODY.PEEK[HEADER.FIELDS (X-MAILER CONTENT-TYPE)]']),
+        call([2], ['BODY.PEEK[]']),
+        call([4], ['BODY.PEEK[HEADER.FIELDS (X-MAILER CONTENT-TYPE)]']),
+        call([4], ['BODY.PEEK[]']),
+    ]
+
+
+@pytest.mark.timeout(5)
+@patch.dict('src.config.config', {'tom': dict(config['tom'], FetchDebounce=0)})
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_reject_cache(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    endpoints = Endpoint(faker.email(), faker.uuid4()), Endpoint(faker.email(), faker.uuid4())
+    unroutable = PlainPacket(*reversed(endpoints), 0, 0, set(), b'').to_message().as_bytes()
+    started = threading.Semaphore(0)
+    proceed = threading.Semaphore(0)
+    notify = threading.Semaphore(0)
+
+    def noop():
+        # each check starts with a NOOP, and pauses there until the test proceeds
+        started.release()
+        proceed.acquire()
+
+    def idle_check(*args, **kwargs):
+        notify.acquire()
+        return [(1, b'EXISTS')]
+
+    store = MagicMock()
+    listener = MagicMock()
+    IMAPClient.side_effect = [store, listener]
+    store.noop.side_effect = noop
+    store.search.side_effect = [[5, 6], [], [], [], [], []]
+    store.fetch.return_value = {5: {b'BODY[]': b'not a packet'}, 6: {b'BODY[]': unroutable}}
+    listener.idle_check.side_effect = idle_check
+
+    mailbox = Mailbox(smtp, imap)
+    assert started.acquire(timeout=1)
+    proceed.release()
+    notify.release()
+    assert started.acquire(timeout=1)
+    store.fetch.assert_called_once_with([5, 6], ['BODY.PEEK[]'])
+
+    # rejected messages are skipped
+    proceed.release()
+    notify.release()
+    assert started.acquire(timeout=1)
+    store.fetch.assert_called_once()
+
+    # until a matching socket is created, which triggers a check without waiting for new emails
+    proceed.release()
+    Socket(mailbox).listen(endpoints[0])
+    assert started.acquire(timeout=1)
+    proceed.release()
+    notify.release()
+    assert started.acquire(timeout=1)
+    store.fetch.assert_called_with([6], ['BODY.PEEK[]'])
+
+    store.noop.side_effect = None
+    listener.idle_check.side_effect = None
+    listener.idle_check.return_value = None
+    proceed.release()
+    notify.release()
+    mailbox.close()
+
+
+@pytest.mark.timeout(5)
+@pytest.mark.parametrize('folder, capabilities', [
+    (None, ['UIDPLUS']),
+    ('Archive', ['MOVE']),
+    ('Archive', []),
+])
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_collect_garbage(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker, folder, capabilities):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    endpoints = Endpoint(faker.email(), faker.uuid4()), Endpoint(faker.email(), faker.uuid4())
+    syn = PlainPacket(*reversed(endpoints), 0, 0, set(), b'', is_syn=True).to_message().as_bytes()
+    collected = threading.Event()
+    listening = threading.Event()
+    search_results = iter([[5, 6], [], []])
+    idle_check_results = iter([[(1, b'EXISTS')], None])
+
+    def search(*args, **kwargs):
+        # examine emails only after listening so that they are processed in the same batch
+        listening.wait()
+        return next(search_results, [])
+
+    def idle_check(*args, **kwargs):
+        listening.wait()
+        return next(idle_check_results, None)
+
+    store = MagicMock()
+    listener = MagicMock()
+    IMAPClient.side_effect = [store, listener]
+    store.search.side_effect = search
+    store.fetch.return_value = {5: {b'BODY[]': syn}, 6: {b'BODY[]': syn}}
+    store.has_capability.side_effect = lambda capability: capability in capabilities
+    store.expunge.side_effect = lambda *args: collected.set()
+    # without UIDPLUS, emails are only flagged
+    store.delete_messages.side_effect = lambda *args: 'UIDPLUS' not in capabilities and collected.set()
+    store.move.side_effect = lambda *args: collected.set()
+    listener.idle_check.side_effect = idle_check
+
+    with patch.dict('src.config.config', {'tom': dict(config['tom'], GCRetention=0, GCInterval=100,
+                                                      GCArchiveFolder=folder)}):
+        mailbox = Mailbox(smtp, imap)
+        Socket(mailbox).listen(endpoints[0])
+        listening.set()
+        assert collected.wait(1)
+        mailbox.close()
+
+    if 'MOVE' in capabilities:
+        store.move.assert_called_once_with([5, 6], folder)
+        store.delete_messages.assert_not_called()
+    else:
+        if folder is not None:
+            store.copy.assert_called_once_with([5, 6], folder)
+        store.delete_messages.assert_called_once_with([5, 6])
+        if 'UIDPLUS' in capabilities:
+            store.expunge.assert_called_once_with([5, 6])
+        else:
+            store.expunge.assert_not_called()
+
+
+@pytest.mark.timeout(5)
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_state_file_without_gc(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker, tmp_path):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    state_file = str(tmp_path / 'state')
+    endpoints = Endpoint(faker.email(), faker.uuid4()), Endpoint(faker.email(), faker.uuid4())
+    syn = PlainPacket(*reversed(endpoints), 0, 0, set(), b'', is_syn=True).to_message().as_bytes()
+    listening = threading.Event()
+
+    def search(*args, **kwargs):
+        listening.wait()
+        return [5, 6]
+
+    store = MagicMock()
+    listener = MagicMock()
+    IMAPClient.side_effect = [store, listener]
+    store.select_folder.return_value = {b'UIDVALIDITY': 1}
+    store.search.side_effect = search
+    store.fetch.return_value = {5: {b'BODY[]': syn}, 6: {b'BODY[]': syn}}
+    listener.idle_check.return_value = None  # skip idle check in tests
+
+    with patch.dict('src.config.config', {'tom': dict(config['tom'], GCRetention=None)}):
+        mailbox = Mailbox(smtp, imap, state_file=state_file)
+        Socket(mailbox).listen(endpoints[0])
+        listening.set()
+        mailbox.close()
+
+    store.add_flags.assert_called_once_with([5, 6], [imapclient.SEEN])
+    # processed emails are not kept when they are never collected
+    with open(state_file, 'rb') as f:
+        assert 'processed' not in pickle.load(f)
+
+
+@pytest.mark.timeout(5)
+@pytest.mark.parametrize('supported', [True, False])
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_binary_fetch(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker, supported: bool):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+
+    def fetch(uids, data):
+        if data == ['BODY.PEEK[]']:
+            return {uid: {b'BODY[]': b'not a packet'} for uid in uids}
+        if not supported:
+            raise imapclient.exceptions.IMAPClientError('FETCH command error: NO [UNKNOWN-CTE]')
+        return {uid: {b'BODY[HEADER]': b'Content-Type: text/plain\r\n\r\n', b'BINARY[1]': b''} for uid in uids}
+
+    store = MagicMock()
+    listener = MagicMock()
+    IMAPClient.side_effect = [store, listener]
+    store.capabilities.return_value = (b'IMAP4REV1', b'BINARY')
+    store.search.return_value = [5, 6]
+    store.fetch.side_effect = fetch
+    listener.idle_check.return_value = None  # skip idle check in tests
+
+    mailbox = Mailbox(smtp, imap)
+    mailbox.close()
+
+    expected = [call([5, 6], ['BODY.PEEK[HEADER]', 'BINARY.PEEK[1]'])]
+    if not supported:
+        expected.append(call([5, 6], ['BODY.PEEK[]']))
+    assert store.fetch.call_args_list == expected
+
+
+@pytest.mark.timeout(5)
+@patch.dict('src.config.config', {'tom': dict(config['tom'], FetchDebounce=1000, FetchDebounceGap=100)})
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_fetch_debounce(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    idle_check_results = iter([[(3, b'EXISTS')], [(4, b'EXISTS')], [(5, b'EXISTS'), (1, b'RECENT')], [], None])
+    done = threading.Event()
+
+    def idle_check(*args, **kwargs):
+        ret = next(idle_check_results, None)
+        if ret is None:
+            done.set()
+        return ret
+
+    store = MagicMock()
+    listener = MagicMock()
+    IMAPClient.side_effect = [store, listener]
+    store.search.return_value = []
+    listener.idle_check.side_effect = idle_check
+
+    mailbox = Mailbox(smtp, imap)
+    assert done.wait(1)
+    mailbox.close()
+
+    # the burst is fetched once after the initial check
+    assert store.noop.call_count == 2
+    assert [args[0] for args, _ in listener.idle_check.call_args_list[1:4]] == [0.1] * 3
+
+
+@pytest.mark.timeout(5)
+@patch.dict('src.config.config', {'tom': dict(config['tom'], IdleRefresh=10)})
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_idle_refresh(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    done = threading.Event()
+
+    def idle_check(timeout, *args, **kwargs):
+        if listener.idle.call_count > 2:
+            done.set()
+            return None
+        time.sleep(timeout)
+        return []
+
+    store = MagicMock()
+    listener = MagicMock()
+    IMAPClient.side_effect = [store, listener]
+    store.search.return_value = []
+    listener.idle_check.side_effect = idle_check
+
+    mailbox = Mailbox(smtp, imap)
+    assert done.wait(1)
+    mailbox.close()
+
+    assert listener.idle.call_count == 3
+    assert listener.idle_done.call_count == 3
+    assert all(args[0] <= 0.01 for args, _ in listener.idle_check.call_args_list)
+
+
+def idle_check_selfpipe(timeout, selfpipe):
+    rs, _, _ = select.select([selfpipe], [], [], timeout)
+    return None if rs else []
+
+
+@pytest.mark.timeout(5)
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_reconnect_listener(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    fetched = threading.Event()
+    resumed = threading.Event()
+
+    def idle_check(*args, **kwargs):
+        fetched.wait()
+        raise imapclient.exceptions.IMAPClientAbortError('socket error: EOF')
+
+    store, listener, store_new, listener_new = MagicMock(), MagicMock(), MagicMock(), MagicMock()
+    IMAPClient.side_effect = [store, listener, store_new, listener_new]
+    for imap_client in (store, store_new):
+        imap_client.select_folder.return_value = {b'UIDVALIDITY': 1}
+    store.search.return_value = [5]
+    store.fetch.side_effect = lambda *args: fetched.set() or {5: {b'BODY[]': b'not a packet'}}
+    listener.idle_check.side_effect = idle_check
+    store_new.search.side_effect = lambda *args: resumed.set() or []
+    listener_new.idle_check.side_effect = idle_check_selfpipe
+
+    mailbox = Mailbox(smtp, imap)
+    assert resumed.wait(1)
+    stats = mailbox.imap_stats()
+    mailbox.close()
+
+    # both sessions are replaced, and examination resumes after the last examined UID
+    store.shutdown.assert_called_once()
+    listener.shutdown.assert_called_once()
+    store_new.search.assert_called_once_with(['UID', '6:*', 'UNSEEN'] + HEADER_CRITERIA)
+    store_new.logout.assert_called_once()
+    listener_new.logout.assert_called_once()
+    assert stats.connected
+    assert stats.reconnects == 1
+    assert stats.reconnect_attempts == 1
+    assert stats.total_outage == stats.last_outage >= 0
+
+
+@pytest.mark.timeout(5)
+@patch.dict('src.config.config', {'tom': dict(config['tom'], FetchBatchSize=2, ReconnectDelay=100)})
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_reconnect_store(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    resumed = threading.Event()
+
+    def fetch(uids, data):
+        if uids == [3]:
+            raise OSError('connection reset')
+        return {uid: {b'BODY[]': b'not a packet'} for uid in uids}
+
+    store, listener, store_new, listener_new = MagicMock(), MagicMock(), MagicMock(), MagicMock()
+    # the first attempt fails
+    IMAPClient.side_effect = [store, listener, OSError('connection refused'), store_new, listener_new]
+    for imap_client in (store, store_new):
+        imap_client.select_folder.return_value = {b'UIDVALIDITY': 1}
+    store.search.return_value = [1, 2, 3]
+    store.fetch.side_effect = fetch
+    listener.idle_check.side_effect = idle_check_selfpipe
+    store_new.search.return_value = [3]
+    store_new.fetch.side_effect = lambda *args: resumed.set() or {3: {b'BODY[]': b'not a packet'}}
+    listener_new.idle_check.side_effect = idle_check_selfpipe
+
+    mailbox = Mailbox(smtp, imap)
+    assert resumed.wait(1)
+    stats = mailbox.imap_stats()
+    mailbox.close()
+
+    # the failed batch is fetched again
+    store_new.search.assert_called_once_with(['UID', '3:*', 'UNSEEN'] + HEADER_CRITERIA)
+    store_new.fetch.assert_called_once_with([3], ['BODY.PEEK[]'])
+    assert IMAPClient.call_count == 5
+    assert stats.reconnects == 1
+    assert stats.reconnect_attempts == 2
+    assert stats.last_outage >= 0.1
+
+
+@pytest.mark.timeout(5)
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_process_error(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    endpoints = Endpoint(faker.email(), faker.uuid4()), Endpoint(faker.email(), faker.uuid4())
+    packet = PlainPacket(*reversed(endpoints), 0, 0, set(), b'').to_message().as_bytes()
+
+    store = MagicMock()
+    listener = MagicMock()
+    IMAPClient.side_effect = [store, listener]
+    store.search.return_value = [5]
+    store.fetch.return_value = {5: {b'BODY[]': packet}}
+    listener.idle_check.return_value = None  # skip idle check in tests
+
+    with patch('src.tom._mailbox.mailbox_listener.MailboxListener._MailboxListener__try_process_packets',
+               side_effect=Exception('cannot decrypt')):
+        mailbox = Mailbox(smtp, imap)
+        mailbox.close()
+
+    # the packet is rejected without reconnecting
+    store.fetch.assert_called_once_with([5], ['BODY.PEEK[]'])
+    store.shutdown.assert_not_called()
+    assert IMAPClient.call_count == 2
+    assert mailbox.imap_stats().reconnects == 0
+
+
+@pytest.mark.timeout(5)
+@patch('smtplib.SMTP')
+@patch('src.tom._mailbox.imapclient.IMAPClient')
+def test_parse_error(IMAPClient: MagicMock, SMTP: MagicMock, faker: Faker, tmp_path):
+    smtp = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    imap = Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+    state_file = str(tmp_path / 'state')
+
+    store = MagicMock()
+    listener = MagicMock()
+    IMAPClient.side_effect = [store, listener]
+    store.select_folder.return_value = {b'UIDVALIDITY': 1}
+    store.search.return_value = [5, 6]
+    # 5 lacks the requested body
+    store.fetch.return_value = {5: {}, 6: {b'BODY[]': b'not a packet'}}
+    listener.idle_check.return_value = None  # skip idle check in tests
+
+    mailbox = Mailbox(smtp, imap, state_file=state_file)
+    mailbox.close()
+
+    # the email is rejected as invalid and the batch is still examined
+    with open(state_file, 'rb') as f:
+        state = pickle.load(f)
+    assert state['last_uid'] == 6
+    assert state['pending_uids'] == set()
@@ -0,0 +1,86 @@
+import threading
+import pytest
+from .socket_test_helper import SocketTestHelper
+from src.tom._mailbox import socket_context
+
+
+@pytest.fixture()
+def helper() -> SocketTestHelper:
+    helper = SocketTestHelper()
+    yield helper
+    helper.close()
+
+
+@pytest.mark.timeout(5)
+def test_schedule(helper: SocketTestHelper):
+    done = threading.Event()
+
+    handle = helper.mailbox._schedule_task(0.2, done.set)
+
+    assert handle.pending
+    assert done.wait(1)
+    assert not handle.pending
+
+
+@pytest.mark.timeout(5)
+def test_cancel(helper: SocketTestHelper):
+    done = threading.Event()
+
+    handle = helper.mailbox._schedule_task(0.2, done.set)
+    helper.mailbox._cancel_task(handle)
+
+    assert handle.cancelled
+    assert not done.wait(0.5)
+
+
+@pytest.mark.timeout(5)
+def test_cancel_many(helper: SocketTestHelper):
+    done = threading.Event()
+
+    handles = [helper.mailbox._schedule_task(0.2, done.set) for _ in range(1000)]
+    for handle in handles[1:]:
+        helper.mailbox._cancel_task(handle)
+
+    assert done.wait(1)
+    assert not handles[0].pending
+
+
+@pytest.mark.timeout(5)
+def test_ordering(helper: SocketTestHelper):
+    order = []
+    done = threading.Event()
+    key = object()
+
+    for i in range(10):
+        helper.mailbox._schedule_task(0.1, lambda i=i: order.append(i), key)
+    helper.mailbox._schedule_task(0.1, done.set, key)
+
+    assert done.wait(1)
+    assert order == list(range(10))
+
+
+def test_rto_initial(helper: SocketTestHelper):
+    context = socket_context.Connected(*helper.fake_endpoints())
+
+    assert helper.mailbox._rto(context) == 1
+
+
+def test_rto_estimate(helper: SocketTestHelper):
+    helper.mock_config['tom']['MinRTO'] = 0
+    context = socket_context.Connected(*helper.fake_endpoints())
+
+    helper.mailbox._update_rtt(context, 2)
+    assert helper.mailbox._rto(context) == 2 + 4 * 1
+    helper.mailbox._update_rtt(context, 2)
+    assert context.srtt == 2
+    assert context.rttvar == 0.75
+    assert helper.mailbox._rto(context) == 2 + 4 * 0.75
+
+
+def test_rto_bounds(helper: SocketTestHelper):
+    context = socket_context.Connected(*helper.fake_endpoints())
+
+    helper.mailbox._update_rtt(context, 0.01)
+    assert helper.mailbox._rto(context) == 1
+    helper.mailbox._update_rtt(context, 1000)
+    assert helper.mailbox._rto(context) == 60
@@ -0,0 +1,79 @@
+import pytest
+from email.mime.application import MIMEApplication
+from src.tom._mailbox.packet import Packet, PlainPacket, SecurePacket, PacketBundle
+from src.config import config
+
+
+def test_pack(endpoints, make_plain):
+    packets = [make_plain(i, 100) for i in range(5)]
+
+    ret = PacketBundle.pack(packets, 250)
+
+    assert ret == [
+        PacketBundle(*endpoints, packets[0:2]),
+        PacketBundle(*endpoints, packets[2:4]),
+        packets[4],
+    ]
+
+
+def test_pack_oversized(make_plain):
+    packets = [make_plain(0, 100), make_plain(1, 300)]
+
+    ret = PacketBundle.pack(packets, 250)
+
+    assert ret == packets
+
+
+def test_to_message(endpoints, make_plain):
+    bundle = PacketBundle(*endpoints, [make_plain(i) for i in range(2)])
+    msg = bundle.to_message()
+    assert msg.get('Content-Type') == 'application/x-mailim-packet-bundle'
+    assert msg.get('From') == '{} <{}>'.format(endpoints[0].port, endpoints[0].address)
+    assert msg.get('To') == '{} <{}>'.format(endpoints[1].port, endpoints[1].address)
+    assert msg.get('X-Mailer') == config['tom']['X-Mailer']
+
+
+def test_from_to_message_plain(endpoints, make_plain):
+    bundle = PacketBundle(*endpoints, [make_plain(i) for i in range(3)])
+    bundle_recv = PacketBundle.from_message(bundle.to_message())
+    assert bundle_recv == bundle
+    assert not bundle_recv.secure
+
+
+def test_from_to_message_secure(endpoints, make_secure):
+    bundle = PacketBundle(*endpoints, [make_secure() for i in range(3)])
+    msg = bundle.to_message()
+    assert msg.get('Content-Type') == 'application/x-mailim-packet-secure-bundle'
+    bundle_recv = PacketBundle.from_message(msg)
+    assert bundle_recv == bundle
+    assert bundle_recv.secure
+
+
+def test_from_message_invalid_content_type(make_plain):
+    msg = make_plain(0).to_message()
+    with pytest.raises(Exception) as execinfo:
+        PacketBundle.from_message(msg)
+    assert execinfo.match('invalid Content-Type header')
+
+
+def test_from_message_empty():
+    msg = MIMEApplication(b'', 'x-mailim-packet-bundle')
+    msg.add_header('X-Mailer', config['tom']['X-Mailer'])
+    with pytest.raises(Exception) as execinfo:
+        PacketBundle.from_message(msg)
+    assert execinfo.match('empty bundle')
+
+
+def test_to_bytes(endpoints, make_secure):
+    bundle = PacketBundle(*endpoints, [make_secure() for i in range(3)])
+    assert bundle.to_bytes() == bundle.to_message().as_bytes()
+
+
+def test_decoder_for(endpoints, make_plain, make_secure):
+    plain = make_plain(0)
+    secure = make_secure()
+    assert Packet.decoder_for(plain.to_message()) is PlainPacket
+    assert Packet.decoder_for(secure.to_message()) is SecurePacket
+    assert Packet.decoder_for(PacketBundle(*endpoints, [plain, plain]).to_message()) is PacketBundle
+    assert Packet.decoder_for(PacketBundle(*endpoints, [secure, secure]).to_message()) is PacketBundle
+    assert Packet.decoder_for(MIMEApplication(b'', 'octet-stream')) is None
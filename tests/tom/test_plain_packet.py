@@ -1,8 +1,9 @@
 import email
+from unittest.mock import patch
 import pytest
 from faker import Faker
 from src.tom import Endpoint
-from src.tom._mailbox.packet import PlainPacket as Packet
+from src.tom._mailbox.packet import PlainPacket as Packet, FastMessage
 from src.config import config
 
 
@@ -64,3 +65,28 @@ def test_line_ending(packet: Packet):
     recovered_msg = email.message_from_bytes(bytes_)
     recovered_packet = Packet.from_message(recovered_msg)
     assert recovered_packet.payload == payload
+
+
+def test_to_bytes(packet: Packet):
+    assert packet.to_bytes() == packet.to_message().as_bytes()
+
+
+def test_from_to_bytes(packet: Packet):
+    recovered_packet = Packet.from_message(FastMessage.parse(packet.to_bytes()))
+    assert recovered_packet == packet
+
+
+def test_from_to_bytes_binary(packet: Packet):
+    data = packet.to_bytes(binary=True)
+    assert Packet.from_message(FastMessage.parse(data)) == packet
+    assert Packet.from_message(email.message_from_bytes(data)) == packet
+
+
+@pytest.mark.parametrize('legacy', [True, False])
+def test_legacy_acks(packet: Packet, legacy: bool):
+    with patch.dict('src.config.config', {'tom': dict(config['tom'], LegacyAcks=legacy)}):
+        pb = packet.to_pb()
+
+    assert bool(pb.header.acks) == legacy
+    assert bool(pb.header.ack_ranges) != legacy
+    assert Packet.from_pb((packet.from_, packet.to), pb) == packet
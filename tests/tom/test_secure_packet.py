@@ -6,7 +6,7 @@ from faker import Faker
 import doubleratchet.header
 from xeddsa.implementations.xeddsa25519 import XEdDSA25519, XEdDSA
 from src.tom import Endpoint
-from src.tom._mailbox.packet import PlainPacket, SecurePacket
+from src.tom._mailbox.packet import PlainPacket, SecurePacket, AckSet, FastMessage
 from src.crypto.doubleratchet import DoubleRatchet, KeyPair
 from src.config import config
 
@@ -89,6 +89,15 @@ def test_line_ending(packet: SecurePacket):
     assert recovered_packet.body == body
 
 
+def test_to_bytes(packet: SecurePacket):
+    assert packet.to_bytes() == packet.to_message().as_bytes()
+
+
+def test_from_to_bytes(packet: SecurePacket):
+    recovered_packet = SecurePacket.from_message(FastMessage.parse(packet.to_bytes()))
+    assert recovered_packet == packet
+
+
 def test_encrypt(faker: Faker):
     payload = faker.binary(111)
     is_syn = faker.pybool()
@@ -141,7 +150,7 @@ def test_decrypt(faker: Faker, packet: SecurePacket, mock_secure_packet_body_pb:
     mock_secure_packet_signed_part_pb.return_value.body.CopyFrom\
         .assert_called_once_with(mock_secure_packet_body_pb.return_value)
     header_to_verify = mock_secure_packet_signed_part_pb.return_value.header.CopyFrom.call_args[0][0]
-    assert set((ack.seq, ack.attempt) for ack in header_to_verify.acks) == packet.acks
+    assert AckSet.from_pb(header_to_verify.acks, header_to_verify.ack_ranges) == packet.acks
     assert header_to_verify.dh_pub == packet.dr_header.dh_pub
     assert header_to_verify.n == packet.dr_header.n
     assert header_to_verify.pn == packet.dr_header.pn
@@ -237,6 +246,35 @@ def test_encrypt_decrypt_signature(plain_packet: PlainPacket, ratchets, xeddsas)
     assert execinfo.match('invalid signature')
 
 
+@pytest.mark.parametrize('legacy_sender, legacy_receiver', [(True, False), (False, True)])
+def test_encrypt_decrypt_legacy_acks(plain_packet: PlainPacket, ratchets, xeddsas, legacy_sender, legacy_receiver):
+    alice_ratchet, bob_ratchet = ratchets
+    alice_xeddsa, bob_xeddsa = xeddsas
+
+    with patch.dict('src.config.config', {'tom': dict(config['tom'], LegacyAcks=legacy_sender)}):
+        msg = SecurePacket.encrypt(plain_packet, bob_ratchet, bob_xeddsa).to_message()
+    with patch.dict('src.config.config', {'tom': dict(config['tom'], LegacyAcks=legacy_receiver)}):
+        decryped_packet = SecurePacket.decrypt(SecurePacket.from_message(msg), alice_ratchet, alice_xeddsa)
+
+    assert decryped_packet == plain_packet
+
+
+def test_legacy_acks_order(packet: SecurePacket):
+    pb = packet.to_pb()
+    del pb.header.acks[:]
+    del pb.header.ack_ranges[:]
+    # peers before ack ranges sign acks in the order of their own set iteration
+    acks = sorted(packet.acks, reverse=True)
+    for seq, attempt in acks:
+        pb.header.acks.add(seq=seq, attempt=attempt)
+
+    received_packet = SecurePacket.from_pb((packet.from_, packet.to), pb)
+
+    assert received_packet == packet
+    with patch.dict('src.config.config', {'tom': dict(config['tom'], LegacyAcks=True)}):
+        assert [(id.seq, id.attempt) for id in received_packet.to_pb().header.acks] == acks
+
+
 def test_encrypt_handshake_packet(faker: Faker, plain_packet: PlainPacket):
     plain_packet.payload = b''
     plain_packet.acks = set()
@@ -0,0 +1,54 @@
+import threading
+import time
+import pytest
+from src.tom._mailbox.serial_executor import SerialExecutor
+
+
+@pytest.mark.timeout(5)
+def test_serial():
+    executor = SerialExecutor(4)
+    mutex = threading.Lock()
+    running = []
+    order = []
+
+    def task(i):
+        with mutex:
+            running.append(i)
+            assert len(running) == 1, 'tasks with the same key ran concurrently'
+        time.sleep(0.01)
+        with mutex:
+            running.remove(i)
+            order.append(i)
+
+    for i in range(20):
+        executor.submit(lambda i=i: task(i), 'key')
+    executor.shutdown()
+
+    assert order == list(range(20))
+
+
+@pytest.mark.timeout(5)
+def test_parallel():
+    executor = SerialExecutor(2)
+    barrier = threading.Barrier(2, timeout=1)
+
+    executor.submit(barrier.wait, 'key0')
+    executor.submit(barrier.wait, 'key1')
+    executor.shutdown()
+
+    assert not barrier.broken
+
+
+@pytest.mark.timeout(5)
+def test_exception():
+    executor = SerialExecutor(1)
+    done = threading.Event()
+
+    def fail():
+        raise Exception()
+
+    executor.submit(fail, 'key')
+    executor.submit(done.set, 'key')
+    executor.shutdown()
+
+    assert done.is_set()
@@ -0,0 +1,149 @@
+from unittest.mock import patch, call, MagicMock
+import threading
+import time
+import pytest
+import smtplib
+from faker import Faker
+from src.tom import Credential
+from src.tom._mailbox.smtp_pool import SMTPPool
+
+
+@pytest.fixture()
+def credential(faker: Faker) -> Credential:
+    return Credential(host=faker.hostname(), port=faker.pyint(), username=faker.email(), password=faker.password())
+
+
+@pytest.fixture()
+def mock_smtp() -> MagicMock:
+    with patch('smtplib.SMTP', side_effect=lambda *args: MagicMock()) as fixture:
+        yield fixture
+
+
+def test_init(credential: Credential, mock_smtp: MagicMock):
+    pool = SMTPPool(credential, 4, 60, 10)
+
+    mock_smtp.assert_called_once_with(credential.host, credential.port)
+    smtp = pool.checkout()
+    smtp.assert_has_calls([
+        call.ehlo(),
+        call.starttls(),
+        call.login(credential.username, credential.password),
+    ])
+    pool.checkin(smtp)
+    pool.close()
+    smtp.close.assert_called_once()
+
+
+def test_reuse(credential: Credential, mock_smtp: MagicMock):
+    pool = SMTPPool(credential, 4, 60, 10)
+
+    smtp = pool.checkout()
+    pool.checkin(smtp)
+
+    assert pool.checkout() is smtp
+    assert mock_smtp.call_count == 1
+
+
+@pytest.mark.timeout(5)
+def test_parallel(credential: Credential, mock_smtp: MagicMock):
+    pool = SMTPPool(credential, 2, 60, 10)
+
+    smtp0 = pool.checkout()
+    smtp1 = pool.checkout()
+    assert smtp0 is not smtp1
+    assert mock_smtp.call_count == 2
+
+    def checkin():
+        time.sleep(0.5)
+        pool.checkin(smtp0)
+
+    thread = threading.Thread(target=checkin)
+    thread.start()
+    start = time.time()
+    assert pool.checkout() is smtp0
+    assert time.time() - start > 0.4
+    assert mock_smtp.call_count == 2
+    thread.join()
+
+
+def test_broken(credential: Credential, mock_smtp: MagicMock):
+    pool = SMTPPool(credential, 1, 60, 10)
+
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        with pool.session() as smtp:
+            smtp.sendmail.side_effect = smtplib.SMTPServerDisconnected
+            smtp.sendmail()
+
+    smtp.close.assert_called_once()
+    assert pool.checkout() is not smtp
+
+
+def test_health_check(credential: Credential, mock_smtp: MagicMock):
+    pool = SMTPPool(credential, 1, 60, 0)
+
+    smtp = pool.checkout()
+    smtp.noop.side_effect = smtplib.SMTPServerDisconnected
+    pool.checkin(smtp)
+    time.sleep(0.01)
+
+    assert pool.checkout() is not smtp
+    smtp.close.assert_called_once()
+
+
+def test_idle_timeout(credential: Credential, mock_smtp: MagicMock):
+    pool = SMTPPool(credential, 2, 0, 10)
+
+    smtp = pool.checkout()
+    pool.checkin(smtp)
+    time.sleep(0.01)
+
+    assert pool.checkout() is not smtp
+    smtp.close.assert_called_once()
+
+
+def test_reap(credential: Credential, mock_smtp: MagicMock):
+    pool = SMTPPool(credential, 2, 0, 10)
+
+    smtp = pool.checkout()
+    pool.checkin(smtp)
+    time.sleep(0.01)
+    pool.reap()
+
+    smtp.close.assert_called_once()
+    assert pool.checkout() is not smtp
+
+
+def test_send(credential: Credential, mock_smtp: MagicMock):
+    pool = SMTPPool(credential, 1, 60, 10)
+    smtp = pool.checkout()
+    smtp.has_extn.side_effect = lambda name: name != 'binarymime'
+
+    assert not SMTPPool.binary(smtp)
+    SMTPPool.send(smtp, 'a@b.c', 'd@e.f', b'msg')
+
+    smtp.sendmail.assert_called_once_with('a@b.c', 'd@e.f', b'msg')
+
+
+def test_send_binary(credential: Credential, mock_smtp: MagicMock):
+    pool = SMTPPool(credential, 1, 60, 10)
+    smtp = pool.checkout()
+    smtp.has_extn.return_value = True
+    smtp.mail.return_value = smtp.rcpt.return_value = smtp.getreply.return_value = (250, b'OK')
+
+    assert SMTPPool.binary(smtp)
+    SMTPPool.send(smtp, 'a@b.c', 'd@e.f', b'\x00\r\n', True)
+
+    smtp.mail.assert_called_once_with('a@b.c', ['BODY=BINARYMIME'])
+    smtp.rcpt.assert_called_once_with('d@e.f')
+    smtp.send.assert_called_once_with(b'BDAT 3 LAST\r\n\x00\r\n')
+    smtp.sendmail.assert_not_called()
+
+
+def test_send_binary_rejected(credential: Credential, mock_smtp: MagicMock):
+    pool = SMTPPool(credential, 1, 60, 10)
+    smtp = pool.checkout()
+    smtp.mail.return_value = smtp.rcpt.return_value = (250, b'OK')
+    smtp.getreply.return_value = (554, b'rejected')
+
+    with pytest.raises(smtplib.SMTPDataError):
+        SMTPPool.send(smtp, 'a@b.c', 'd@e.f', b'msg', True)